@@ -8,6 +8,7 @@ import sys
 import subprocess
 import shutil
 from pathlib import Path
+from typing import Dict, List, Optional, Union
 
 def print_step(step_num: int, description: str) -> None:
     """Imprime uma etapa numerada com formatação"""
@@ -18,21 +19,20 @@ def print_substep(description: str) -> None:
     """Imprime uma sub-etapa com indentação"""
     print(f"   🔹 {description}")
 
-def run_command(command: str, description: str) -> bool:
+def run_command(command: Union[str, List[str]], description: str,
+                env: Optional[Dict[str, str]] = None) -> bool:
     """Executa um comando e mostra o resultado"""
-    print(f"Executando: {command}")
+    # Lista de argumentos roda direto, sem abrir um shell intermediário
+    use_shell = isinstance(command, str)
+    print(f"Executando: {command if use_shell else ' '.join(command)}")
     try:
-        result = subprocess.run(command, shell=True, check=True, 
-                              capture_output=True, text=True)
+        # A saída vai direto ao terminal: progresso ao vivo, sem acumular na memória
+        subprocess.run(command, shell=use_shell, check=True, env=env)
         print("✅ Sucesso!")
-        if result.stdout:
-            print("Saída:", result.stdout[:200] + "..." if len(result.stdout) > 200 else result.stdout)
         return True
     except subprocess.CalledProcessError as e:
         print("❌ Erro!")
         print("Código de erro:", e.returncode)
-        if e.stderr:
-            print("Erro:", e.stderr)
         return False
 
 def check_python_version():
@@ -62,7 +62,34 @@ def install_requirements() -> bool:
     print("   📦 colorama - Cores no terminal")
     print("   📦 requests - Cliente HTTP")
     
-    return run_command("pip install -r requirements.txt", "Instalando dependências")
+    # Cache de wheels local: reinstalações não baixam torch de novo
+    env = os.environ.copy()
+    env.setdefault("PIP_CACHE_DIR", os.path.abspath(".pip-cache"))
+    if os.path.isdir(env["PIP_CACHE_DIR"]):
+        print_substep(f"Reutilizando cache de pacotes em {env['PIP_CACHE_DIR']}")
+    
+    command = [
+        sys.executable, "-m", "pip", "install",
+        "--prefer-binary",              # Wheels prontos em vez de compilar fontes
+        "--no-input",
+        "--disable-pip-version-check",
+        "-r", "requirements.txt"
+    ]
+    return run_command(command, "Instalando dependências", env=env)
+
+# Importa os módulos recebidos em argv e imprime os que falharem
+# Uma linha "módulo<TAB>status" por módulo, impressa assim que ele é testado: qualquer
+# exceção (não só ImportError) fica restrita ao módulo que a causou
+_IMPORT_PROBE = """
+import importlib, sys
+for name in sys.argv[1:]:
+    try:
+        importlib.import_module(name)
+        status = "ok"
+    except Exception as e:
+        status = " ".join(f"{type(e).__name__}: {e}".split())
+    print(f"{name}\t{status}", flush=True)
+"""
 
 def test_installation() -> bool:
     """Testa se a instalação foi bem-sucedida"""
@@ -79,13 +106,27 @@ def test_installation() -> bool:
         ("requests", "requests", "Cliente HTTP para APIs")
     ]
     
+    # Um único processo filho importa tudo: torch/transformers não ficam
+    # carregados (segundos e centenas de MB) no processo do instalador
+    result = subprocess.run(
+        [sys.executable, "-c", _IMPORT_PROBE, *(module for module, _, _ in test_imports)],
+        capture_output=True, text=True
+    )
+    statuses = dict(line.split("\t", 1) for line in result.stdout.splitlines() if "\t" in line)
+    if result.returncode != 0:
+        # Processo de teste abortou (ex.: falha nativa): só os módulos sem status ficam sem verificação
+        stderr = result.stderr.strip()
+        reason = stderr.splitlines()[-1] if stderr else f"código de saída {result.returncode}"
+        for module, _, _ in test_imports:
+            statuses.setdefault(module, f"não verificado ({reason})")
+    
     failed_imports: list[str] = []
     for module, package, description in test_imports:
-        try:
-            __import__(module)
+        status = statuses.get(module, "não verificado")
+        if status == "ok":
             print(f"   ✅ {package} - {description}")
-        except ImportError:
-            print(f"   ❌ {package} - {description}")
+        else:
+            print(f"   ❌ {package} - {description}: {status}")
             failed_imports.append(package)
     
     if failed_imports:
@@ -117,7 +158,7 @@ def setup_directories() -> None:
     print_substep("Configurando arquivos de documentação...")
     readme_files = {
         "index/README.txt": "Este diretório contém os índices FAISS gerados automaticamente.\nExecute: python rag_chatbot_icta.py --build-index",
-        "history/README.txt": "Este diretório contém o histórico de conversas em formato JSONL.\nGerado automaticamente durante o uso do chat."
+        "history/README.txt": "Este diretório contém o histórico de conversas: um arquivo chat_AAAAMMDD_HHMMSS.jsonl por sessão,\ncom uma linha JSON por mensagem. Gerado automaticamente durante o uso do chat."
     }
     
     for file_path, content in readme_files.items():
@@ -9,21 +9,42 @@ GitHub: https://github.com/jesseff20/rag-chatbot
 
 from __future__ import annotations
 import os
+import re
 import json
 import sys
 import time
+import mmap
+import pickle
+import platform
+import shutil
+import functools
+import hashlib
+import itertools
+import math
+import queue
+import threading
+from collections import OrderedDict
 from datetime import datetime
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Any, List, Dict, Optional
+from typing import TYPE_CHECKING, Any, List, Dict, Optional
 
 # Imports principais
-import faiss  # type: ignore
 import numpy as np
 from tqdm import tqdm
 from colorama import Fore, Style, init, Back
-from sentence_transformers import SentenceTransformer
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
-import torch
+
+# faiss, torch, transformers e sentence_transformers são importados sob demanda
+# nas funções que os usam: o menu abre sem pagar segundos de import
+if TYPE_CHECKING:  # pragma: no cover
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+# Serialização JSON acelerada (opcional)
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende do ambiente
+    orjson = None
 
 # Inicializar colorama para Windows
 init(autoreset=True)
@@ -40,34 +61,543 @@ DEFAULT_CONFIG = {
     "history_path": "./history/chat_history.jsonl",
     "chunk_size": 600,  # Aumentado para chunks maiores
     "overlap": 120,     # Sobreposição otimizada (20% do chunk_size)
+    "chunk_strategy": "tokens",  # "tokens" (janelas do tokenizer do encoder) ou "chars" (chunk_text)
+    "chunk_max_tokens": 256,     # Limitado ainda ao max_seq_length do encoder
+    "chunk_token_overlap": 32,   # Tokens repetidos entre janelas consecutivas
     "top_k": 12,        # Aumentado para recuperar mais contexto relevante
     "max_tokens": 10000,  # Significativamente aumentado para respostas mais completas
+    "answer_max_new_tokens": 256,  # Tokens gerados por resposta (FLAN-T5 raramente passa disso)
+    "prompt_max_tokens": 512,  # Entrada do FLAN-T5 (posições treinadas); contextos entram até caber
     "embedding_model": "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",  # Melhor para português
+    "embedding_backend": "torch",  # "torch", "onnx" ou "openvino" (ONNX/OpenVINO requerem optimum)
+    "embedding_quantization": "none",  # "int8": camadas lineares do encoder em INT8 dinâmico (só CPU e backend torch)
+    "use_gpu": True,             # Embeddings (CUDA/MPS) e FLAN-T5 (CUDA) na GPU quando disponível
     "generation_model": "google/flan-t5-base",  # Volta para FLAN-T5 que é mais estável
-    "fallback_model": "google/flan-t5-small"  # Fallback menor
+    "fallback_model": "google/flan-t5-small",  # Fallback menor
+    "multiprocess_min_chunks": 50000,  # A partir deste nº de chunks (só CPU) gera embeddings em vários processos
+    "hnsw_threshold": 10000,      # A partir deste nº de chunks usa HNSW em vez de busca exaustiva
+    "hnsw_m": 32,                 # Vizinhos por nó do grafo HNSW
+    "hnsw_ef_construction": 200,  # Qualidade da construção do grafo
+    "hnsw_ef_search": 64,         # Amplitude da busca no grafo (recall x latência)
+    "ivf_threshold": 100000,      # A partir deste nº de chunks usa IVF (partições) em vez de HNSW
+    "ivf_train_per_list": 40,     # Vetores de treino amostrados por partição do IVF
+    "index_quantization": "fp16", # Armazenamento dos vetores: "none" (float32), "fp16" ou "int8"
+    "faiss_gpu": False,           # Índices exaustivos na GPU (requer faiss-gpu; HNSW fica na CPU). Compensa
+                                  # com buscas em lote (search_index_batch); consulta isolada é mais lenta na GPU
+    "generation_backend": "torch",  # "onnx": FLAN-T5 exportado e quantizado em INT8 no ONNX Runtime (só CPU, requer optimum)
+    "generation_precision": "auto",  # Pesos do FLAN-T5: "auto", "fp32", "fp16", "bf16" ou "int8" (GPU + bitsandbytes)
+    "compile_model": True,        # torch.compile no forward do FLAN-T5 (apenas GPU)
+    "response_cache_size": 512,   # Respostas geradas guardadas por gerador (0 desativa)
+    "semantic_cache_threshold": 0.95,  # Similaridade mínima para reaproveitar resposta de pergunta parecida
+    "query_cache_size": 1024,     # Embeddings de perguntas repetidas reaproveitados na busca (0 desativa)
+    "rag_confident_threshold": 0.85   # Score do melhor trecho a partir do qual ele é a resposta (sem FLAN-T5)
+}
+
+# Tipos de quantização escalar do FAISS para cada opção de "index_quantization"
+_SQ_TYPES = {
+    "fp16": "QT_fp16",
+    "int8": "QT_8bit",
 }
 
 # ================================
 # Classes de Dados
 # ================================
 
-@dataclass
+# Sem __dict__ por instância (slots dos dataclasses existe a partir do Python 3.10)
+_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+@dataclass(**_SLOTS)
 class Metadata:
     source: str
     chunk_id: int
     start_char: int
     end_char: int
+    basename: str = ""  # Nome do arquivo de origem, calculado uma vez na indexação
 
-@dataclass  
+@dataclass(**_SLOTS)
 class Retrieved:
     text: str
     meta: Metadata
     score: float
 
+# ================================
+# Carregamento do FLAN-T5
+# ================================
+
+def default_device() -> str:
+    """Dispositivo de inferência: GPU quando disponível"""
+    import torch
+    return "cuda" if DEFAULT_CONFIG.get("use_gpu", True) and torch.cuda.is_available() else "cpu"
+
+def embedding_device() -> str:
+    """Dispositivo do encoder: CUDA, MPS (Apple Silicon) ou CPU"""
+    import torch
+    if DEFAULT_CONFIG.get("use_gpu", True):
+        if torch.cuda.is_available():
+            return "cuda"
+        mps = getattr(torch.backends, "mps", None)
+        if mps is not None and mps.is_available():
+            return "mps"
+    return "cpu"
+
+@functools.lru_cache(maxsize=1)
+def configure_cpu_threads() -> int:
+    """Fixa as threads de CPU do PyTorch e do FAISS (RAG_TORCH_THREADS sobrepõe o padrão: metade dos núcleos)"""
+    import torch
+    # Uma thread por núcleo físico; mais que isso disputa o núcleo e trava as multiplicações
+    threads = int(os.environ.get("RAG_TORCH_THREADS") or max(1, (os.cpu_count() or 2) // 2))
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # Só pode ser definido antes do primeiro trabalho paralelo do PyTorch
+    # O OpenMP do FAISS usaria todos os núcleos lógicos por padrão, disputando com o PyTorch
+    try:
+        import faiss  # type: ignore
+        faiss.omp_set_num_threads(threads)
+    except (ImportError, AttributeError):
+        pass
+    return threads
+
+def _generation_dtype(device: str) -> "torch.dtype":
+    """Escolhe o dtype dos pesos do FLAN-T5 conforme configuração e dispositivo"""
+    import torch
+    precision = DEFAULT_CONFIG.get("generation_precision", "auto")
+    if precision in ("auto", "int8"):  # int8 sem GPU/bitsandbytes cai na escolha automática
+        if device == "cuda":
+            # T5 estoura com facilidade em FP16; BF16 mantém a faixa dinâmica do FP32
+            return torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+        return torch.bfloat16  # Kernels BF16 do oneDNN na CPU
+    return {"fp32": torch.float32, "fp16": torch.float16, "bf16": torch.bfloat16}[precision]
+
+# Comprimentos de entrada usados quando o modelo é compilado: poucos formatos
+# distintos fazem os grafos CUDA serem reaproveitados em vez de recompilados
+_PROMPT_BUCKETS = (128, 256, 400, 512)
+
+def use_compiled_generation(device: str) -> bool:
+    """Indica se o FLAN-T5 roda compilado (torch.compile) neste dispositivo"""
+    import torch
+    # Só vale a pena (e só é estável) com CUDA e torch >= 2.1; no Windows o Inductor não é
+    # suportado. Kernels INT8 do bitsandbytes não são compiláveis
+    torch_version = tuple(int(part) for part in re.findall(r"\d+", torch.__version__)[:2])
+    return (bool(DEFAULT_CONFIG.get("compile_model")) and device == "cuda" and torch_version >= (2, 1)
+            and os.name != "nt" and DEFAULT_CONFIG.get("generation_precision") != "int8")
+
+def generation_cache_kwargs(device: str) -> dict:
+    """Argumentos de cache KV para generate(): cache estático quando compilado"""
+    if not use_compiled_generation(device):
+        return {}
+    import transformers
+    # Cache estático (tamanho fixo) é o que permite capturar o decoder em grafos CUDA
+    return {"cache_implementation": "static"} if hasattr(transformers, "StaticCache") else {}
+
+def _int8_quantization_config(device: str):
+    """Configuração LLM.int8 do bitsandbytes quando solicitada e suportada (apenas GPU)"""
+    if DEFAULT_CONFIG.get("generation_precision") != "int8":
+        return None
+    if device != "cuda":
+        print(f"{Fore.YELLOW}  ⚠️ INT8 requer GPU; usando precisão automática")
+        return None
+    try:
+        import bitsandbytes  # noqa: F401  # type: ignore
+        from transformers import BitsAndBytesConfig
+    except ImportError:
+        print(f"{Fore.YELLOW}  ⚠️ bitsandbytes não instalado; usando precisão automática")
+        return None
+    # Valores atípicos acima do limiar ficam em FP16 (preserva a qualidade do T5)
+    return BitsAndBytesConfig(load_in_8bit=True, llm_int8_threshold=6.0)
+
+def onnx_model_dir(model_name: str) -> str:
+    """Diretório do FLAN-T5 exportado e quantizado para o ONNX Runtime, ao lado do índice"""
+    return os.path.join(os.path.dirname(DEFAULT_CONFIG["index_path"]), "onnx",
+                        model_name.replace("/", "--") + "-int8")
+
+def load_onnx_seq2seq_model(model_name: str):
+    """FLAN-T5 no ONNX Runtime com pesos INT8 (exporta e quantiza na primeira vez); None se indisponível"""
+    try:
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    except ImportError:
+        print(f"{Fore.YELLOW}  ⚠️ optimum[onnxruntime] não instalado; usando PyTorch")
+        return None
+    
+    quantized_dir = onnx_model_dir(model_name)
+    suffix = "_quantized.onnx"
+    try:
+        if not os.path.isdir(quantized_dir):
+            print(f"{Fore.BLUE}  🔄 Exportando {model_name} para ONNX com INT8 (apenas na primeira vez)...")
+            export_dir = quantized_dir + "-export"
+            ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True).save_pretrained(export_dir)
+            # Quantização dinâmica: pesos em INT8 e ativações por lote, com GEMMs int8
+            # (VNNI em x86, dot-product em ARM); sem dados de calibração
+            if platform.machine().lower() in ("arm64", "aarch64"):
+                qconfig = AutoQuantizationConfig.arm64(is_static=False, per_channel=True)
+            else:
+                qconfig = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=True)
+            staging_dir = quantized_dir + "-tmp"
+            for name in sorted(os.listdir(export_dir)):
+                if name.endswith(".onnx"):
+                    quantizer = ORTQuantizer.from_pretrained(export_dir, file_name=name)
+                    quantizer.quantize(save_dir=staging_dir, quantization_config=qconfig)
+            # Renomeado só no fim: uma exportação interrompida não é tomada como pronta
+            os.replace(staging_dir, quantized_dir)
+            shutil.rmtree(export_dir, ignore_errors=True)
+        
+        return ORTModelForSeq2SeqLM.from_pretrained(
+            quantized_dir,
+            encoder_file_name="encoder_model" + suffix,
+            decoder_file_name="decoder_model" + suffix,
+            decoder_with_past_file_name="decoder_with_past_model" + suffix,
+        )
+    except Exception as e:
+        print(f"{Fore.YELLOW}  ⚠️ ONNX Runtime indisponível para {model_name} ({e}); usando PyTorch")
+        return None
+
+def load_seq2seq_model(model_name: str, device: str):
+    """Carrega tokenizer e FLAN-T5 na precisão adequada, compilando o forward quando possível"""
+    import torch
+    configure_cpu_threads()
+    from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+    
+    tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True)
+    
+    if DEFAULT_CONFIG.get("generation_backend") == "onnx" and device == "cpu":
+        # Só na CPU: na GPU os kernels FP16/BF16 do PyTorch já são mais rápidos
+        model = load_onnx_seq2seq_model(model_name)
+        if model is not None:
+            return tokenizer, model
+    
+    quantization_config = _int8_quantization_config(device)
+    if quantization_config is not None:
+        # Pesos em INT8 (LLM.int8) já são posicionados na GPU pelo accelerate
+        model = AutoModelForSeq2SeqLM.from_pretrained(model_name, quantization_config=quantization_config,
+                                                      device_map="auto").eval()
+    else:
+        # Pesos lidos já no dtype final e materializados direto no dispositivo: sem inicializar
+        # o modelo aleatório em FP32 na RAM e depois copiá-lo com .to(device).
+        # transformers >= 4.56 renomeou torch_dtype para dtype (o nome antigo gera aviso)
+        import transformers
+        transformers_version = tuple(int(part) for part in re.findall(r"\d+", transformers.__version__)[:2])
+        dtype_arg = "dtype" if transformers_version >= (4, 56) else "torch_dtype"
+        model = AutoModelForSeq2SeqLM.from_pretrained(
+            model_name, low_cpu_mem_usage=True, device_map={"": device} if device == "cuda" else None,
+            **{dtype_arg: _generation_dtype(device)}
+        ).eval()
+    
+    if use_compiled_generation(device):
+        model.forward = torch.compile(model.forward, mode="reduce-overhead", fullgraph=False)
+    
+    return tokenizer, model
+
+def _prompt_limit(tokenizer, max_length: Optional[int]) -> Optional[int]:
+    """Limite de tokens de entrada: o menor entre o pedido e o do modelo"""
+    # model_max_length vem como um sentinela enorme quando o tokenizer não o define
+    model_max = tokenizer.model_max_length if tokenizer.model_max_length < 1_000_000 else None
+    return min(filter(None, (max_length, model_max)), default=None)
+
+def _prompt_bucket(length: int, limit: Optional[int]) -> int:
+    """Menor comprimento fixo que comporta a entrada (ou o próprio comprimento)"""
+    return next((b for b in _PROMPT_BUCKETS if b >= length and (limit is None or b <= limit)), length)
+
+def _inputs_to_device(inputs, device: str) -> dict:
+    """Envia os tensores ao dispositivo (via memória fixada na GPU)"""
+    if device == "cpu":
+        return inputs  # Já estão onde precisam: nada a copiar
+    non_blocking = device == "cuda"
+    if non_blocking:
+        inputs = {k: v.pin_memory() for k, v in inputs.items()}
+    return {k: v.to(device, non_blocking=non_blocking) for k, v in inputs.items()}
+
+class MicroBatcher:
+    """Junta pedidos que chegam juntos (janela de max_wait) e os processa em lote num thread próprio"""
+    
+    def __init__(self, max_batch: int, max_wait: float, name: str):
+        self.max_batch = max_batch
+        self.max_wait = max_wait  # Janela (s) para juntar pedidos que chegam juntos
+        self.name = name
+        self._queue: queue.Queue = queue.Queue()
+        self._worker: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+    
+    def _submit(self, *request) -> Any:
+        """Enfileira o pedido e bloqueia até o lote em que ele entrou terminar"""
+        future: Future = Future()
+        self._ensure_worker()
+        self._queue.put((*request, future))
+        return future.result()
+    
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._worker.start()
+    
+    def _start_worker(self):
+        """Preparação feita uma vez no thread do worker"""
+    
+    def _run(self):
+        self._start_worker()
+        while True:
+            items = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(items) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._process(items)
+    
+    def _process(self, items: list):
+        """Processa o lote; cada item termina com o Future que recebe o resultado"""
+        raise NotImplementedError
+
+class BatchedFlanRunner(MicroBatcher):
+    """Agrupa gerações simultâneas do FLAN-T5 em lotes por faixa de comprimento"""
+    
+    def __init__(self, tokenizer, model, device: str, max_batch: int = 8, max_wait: float = 0.01):
+        super().__init__(max_batch, max_wait, "flan-batcher")
+        self.tokenizer = tokenizer
+        self.model = model
+        self.device = device
+    
+    def submit(self, prompt: str, input_max_length: Optional[int] = None, **generate_kwargs) -> str:
+        """Gera a resposta do prompt (bloqueia até o lote em que ele entrou terminar)"""
+        return self._submit(prompt, input_max_length, generate_kwargs)
+    
+    def warmup(self):
+        """Gera uma vez por faixa de comprimento, pagando a compilação antes da primeira pergunta"""
+        previous = 0
+        for bucket in _PROMPT_BUCKETS:
+            # previous + 1 palavras curtas caem nesta faixa; roda no thread do executor,
+            # o mesmo que depois reaproveita os grafos CUDA
+            self.submit("a " * (previous + 1), input_max_length=bucket, max_new_tokens=8,
+                        do_sample=False, num_beams=1)
+            previous = bucket
+    
+    def _start_worker(self):
+        if self.device == "cuda":
+            import torch
+            # Stream próprio (o stream atual é por thread): cópias non_blocking e gerações
+            # do lote não esperam o trabalho que o thread principal põe na GPU (embeddings)
+            torch.cuda.set_stream(torch.cuda.Stream())
+    
+    def _process(self, items: list):
+        import torch
+        
+        # Pedidos compatíveis (mesma faixa de comprimento e mesmos parâmetros) viram um lote
+        groups: dict[tuple, list] = {}
+        for prompt, max_length, kwargs, future in items:
+            try:
+                limit = _prompt_limit(self.tokenizer, max_length)
+                ids = self.tokenizer(prompt, truncation=limit is not None, max_length=limit,
+                                     return_token_type_ids=False)["input_ids"]
+                key = (_prompt_bucket(len(ids), limit), tuple(sorted(kwargs.items())))
+                groups.setdefault(key, []).append((ids, kwargs, future))
+            except Exception as e:
+                future.set_exception(e)
+        
+        compiled = use_compiled_generation(self.device)
+        for (bucket, _), group in groups.items():
+            try:
+                # Compilado: comprimento fixo da faixa; senão basta o maior do lote
+                padding = {"padding": "max_length", "max_length": bucket} if compiled else {"padding": "longest"}
+                batch = self.tokenizer.pad({"input_ids": [ids for ids, _, _ in group]},
+                                           return_tensors="pt", **padding)
+                batch = _inputs_to_device(batch, self.device)
+                with torch.inference_mode():
+                    outputs = self.model.generate(
+                        **batch,
+                        use_cache=True,
+                        **generation_cache_kwargs(self.device),
+                        **group[0][1]
+                    )
+                texts = self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+                for (_, _, future), text in zip(group, texts):
+                    future.set_result(text)
+            except Exception as e:
+                for _, _, future in group:
+                    if not future.done():
+                        future.set_exception(e)
+
+@functools.lru_cache(maxsize=4)
+def get_flan_runner(model_name: str, device: str) -> BatchedFlanRunner:
+    """Executor em lotes compartilhado pelo FLAN-T5 carregado"""
+    tokenizer, model = _get_flan(model_name, device)
+    runner = BatchedFlanRunner(tokenizer, model, device)
+    if use_compiled_generation(device):
+        print(f"{Fore.BLUE}🔥 Compilando FLAN-T5 para entradas de {', '.join(map(str, _PROMPT_BUCKETS))} tokens...")
+        try:
+            runner.warmup()
+        except Exception as e:
+            print(f"{Fore.YELLOW}⚠️ Aquecimento do modelo compilado falhou ({e}); compilando sob demanda")
+    return runner
+
+# ================================
+# Cache de Respostas Geradas
+# ================================
+
+def normalize_question(question: str) -> str:
+    """Normaliza a pergunta para comparação (caixa, espaços e pontuação final)"""
+    return " ".join(question.lower().split()).strip(" ?!.,;:")
+
+def generation_signature(model_name: str, params: dict[str, Any]) -> str:
+    """Identifica modelo + parâmetros de geração: respostas em cache só valem para a mesma configuração"""
+    return json.dumps([model_name, params], sort_keys=True)
+
+class ResponseCache:
+    """Cache de respostas do FLAN-T5: exato (LRU) e semântico (perguntas parecidas), persistido em JSONL"""
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.max_entries = DEFAULT_CONFIG["response_cache_size"]
+        self.threshold = DEFAULT_CONFIG["semantic_cache_threshold"]
+        self.path = os.path.join(os.path.dirname(DEFAULT_CONFIG["index_path"]), f"response_cache_{name}.jsonl")
+        # chave -> {"question", "context", "response"}; ordem de inserção/uso = LRU
+        self._entries: OrderedDict[str, dict[str, str]] = OrderedDict()
+        self._loaded = False
+        # chave -> embedding da pergunta, calculado uma única vez por entrada (sob demanda)
+        self._vectors: dict[str, np.ndarray] = {}
+        # Última pergunta procurada sem sucesso: seu embedding serve ao put que vem em seguida
+        self._last_query: Optional[tuple[str, np.ndarray]] = None
+    
+    @staticmethod
+    def _key(question: str, context_hash: str) -> str:
+        return hashlib.blake2b(f"{question}|{context_hash}".encode("utf-8"), digest_size=16).hexdigest()
+    
+    @staticmethod
+    def _context_hash(context: str, generation: str = "") -> str:
+        # A configuração de geração entra no hash: trocar modelo/parâmetros invalida as entradas antigas
+        return hashlib.blake2b(f"{generation}\x1e{context}".encode("utf-8"), digest_size=16).hexdigest()
+    
+    def _load(self):
+        """Lê o cache persistido (uma vez), mantendo só as entradas mais recentes"""
+        self._loaded = True
+        if not os.path.exists(self.path):
+            return
+        lines = 0
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        rec = json.loads(line)
+                        key = self._key(rec["question"], rec["context"])
+                    except (ValueError, KeyError):
+                        continue
+                    self._entries[key] = rec
+                    self._entries.move_to_end(key)
+                    self._evict()
+        except OSError as e:
+            print(f"{Fore.YELLOW}⚠️ Não foi possível ler o cache de respostas: {e}")
+            return
+        # Arquivo cresceu além do necessário: regrava só o que ficou
+        if lines > 2 * self.max_entries:
+            self._rewrite()
+    
+    def _evict(self):
+        """Descarta as entradas menos usadas além do limite (e seus embeddings)"""
+        while len(self._entries) > self.max_entries:
+            key, _ = self._entries.popitem(last=False)
+            self._vectors.pop(key, None)
+    
+    def _rewrite(self):
+        try:
+            with open(self.path, "wb") as f:
+                f.write(b"".join(json_line(rec) for rec in self._entries.values()))
+        except OSError:
+            pass
+    
+    def _embed(self, texts: List[str]) -> Optional[np.ndarray]:
+        """Embeddings normalizados com o mesmo encoder da busca; None se indisponível"""
+        try:
+            encoder = _get_encoder(DEFAULT_CONFIG["embedding_model"])
+            vectors = np.asarray(encoder.encode(texts, convert_to_numpy=True, normalize_embeddings=True),
+                                 dtype=np.float32)
+            return vectors
+        except Exception:
+            return None
+    
+    def _semantic_lookup(self, question: str, context_hash: str) -> Optional[str]:
+        """Procura pergunta parecida com o mesmo contexto"""
+        candidates = [k for k, rec in self._entries.items() if rec["context"] == context_hash]
+        if not candidates:
+            return None
+        
+        # Só passam pelo encoder as perguntas ainda sem embedding (entradas lidas do disco);
+        # a pergunta atual vai no mesmo lote
+        missing = [k for k in candidates if k not in self._vectors]
+        vectors = self._embed([self._entries[k]["question"] for k in missing] + [question])
+        if vectors is None:
+            return None
+        self._vectors.update(zip(missing, vectors[:-1]))
+        query = vectors[-1]
+        self._last_query = (question, query)
+        
+        scores = np.stack([self._vectors[k] for k in candidates]) @ query
+        best = int(scores.argmax())
+        if scores[best] >= self.threshold:
+            self._entries.move_to_end(candidates[best])
+            return self._entries[candidates[best]]["response"]
+        return None
+    
+    def get(self, question: str, context: str = "", generation: str = "") -> Optional[str]:
+        """Resposta em cache para a pergunta (exata ou semelhante), se houver"""
+        if self.max_entries <= 0:
+            return None
+        if not self._loaded:
+            self._load()
+        if not self._entries:
+            return None
+        
+        normalized = normalize_question(question)
+        context_hash = self._context_hash(context, generation)
+        key = self._key(normalized, context_hash)
+        rec = self._entries.get(key)
+        if rec is not None:
+            self._entries.move_to_end(key)
+            return rec["response"]
+        return self._semantic_lookup(normalized, context_hash)
+    
+    def put(self, question: str, context: str, response: str, generation: str = ""):
+        """Guarda a resposta gerada e a acrescenta ao arquivo do cache"""
+        if self.max_entries <= 0:
+            return
+        if not self._loaded:
+            self._load()
+        
+        rec = {"question": normalize_question(question), "context": self._context_hash(context, generation), "response": response}
+        key = self._key(rec["question"], rec["context"])
+        self._entries[key] = rec
+        self._entries.move_to_end(key)
+        # Resposta a uma pergunta que acabou de ser procurada: o embedding já foi calculado
+        if self._last_query is not None and self._last_query[0] == rec["question"]:
+            self._vectors[key] = self._last_query[1]
+        self._last_query = None
+        self._evict()
+        
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "ab") as f:
+                f.write(json_line(rec))
+        except OSError:
+            pass  # Cache em disco é opcional
+
 # ================================
 # Sistema Híbrido RAG + FLAN-T5
 # ================================
 
+# Resumo da empresa em uma frase: o FLAN-T5 segue melhor instruções curtas e cada
+# token a menos no prompt é custo a menos no encoder; detalhes vêm do RAG
+ICTA_SUMMARY = "A ICTA Technology presta consultoria em BI, automação/RPA, IA/ML e integrações ERP (TOTVS)."
+
+FALLBACK_PROMPT_PREFIX = f"""Você é o assistente da ICTA Technology. {ICTA_SUMMARY}
+Responda em português, de forma útil e profissional. Se não souber algo específico da ICTA, diga isso e sugira contato.
+
+"""
+
 class FlanT5Fallback:
     """Sistema de fallback usando FLAN-T5 quando RAG não tem resposta adequada"""
     
@@ -75,7 +605,8 @@ class FlanT5Fallback:
         self.model = None
         self.tokenizer = None
         self.is_loaded = False
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.device = None  # Definido em load_model (evita importar torch na carga do módulo)
+        self.cache = ResponseCache("fallback")
         
     def load_model(self):
         """Carrega o modelo FLAN-T5 para fallback"""
@@ -83,17 +614,16 @@ class FlanT5Fallback:
             return True
             
         try:
+            self.device = default_device()
             print(f"{Fore.BLUE}🤖 Carregando modelo FLAN-T5 para respostas de fallback...")
             
             # Usar modelo do config
             model_name = DEFAULT_CONFIG["generation_model"]
             
-            self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-            self.model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+            # Mesma instância usada pelo restante do sistema (carregada uma vez)
+            self.tokenizer, self.model = _get_flan(model_name, self.device)
             
-            # Mover para GPU se disponível
-            if torch.cuda.is_available():
-                self.model = self.model.to(self.device)
+            if self.device == "cuda":
                 print(f"  🚀 Modelo carregado na GPU")
             else:
                 print(f"  💻 Modelo carregado na CPU")
@@ -108,72 +638,45 @@ class FlanT5Fallback:
     
     def generate_fallback_response(self, question: str, context_type: str = "") -> str:
         """Gera resposta usando FLAN-T5 quando RAG não tem resposta"""
+        # Guloso: a resposta vai para o cache persistido, então precisa ser reproduzível
+        # (amostrada, a primeira saída aleatória ficaria valendo para sempre)
+        params = dict(
+            input_max_length=DEFAULT_CONFIG["prompt_max_tokens"],
+            max_new_tokens=800,
+            do_sample=False,
+            num_beams=1,
+            no_repeat_ngram_size=3
+        )
+        generation = generation_signature(DEFAULT_CONFIG["generation_model"], params)
+        
+        # Pergunta já respondida (ou muito parecida): evita nova geração
+        cached = self.cache.get(question, context_type, generation)
+        if cached is not None:
+            return cached
+        
         if not self.is_loaded:
             if not self.load_model():
                 return "Desculpe, não consegui processar sua pergunta no momento. Tente novamente mais tarde."
         
         try:
-            # Criar prompt contextualizado para ICTA
-            icta_context = """A ICTA Technology é uma consultoria especializada em:
-• Business Intelligence (BI) e Analytics
-• Automação de processos e RPA
-• Inteligência Artificial e Machine Learning
-• Integrações com sistemas ERP (especialmente TOTVS)
-• Transformação digital e otimização de dados
-
-Principais serviços:
-- Dashboards e relatórios executivos
-- Automação de workflows
-- Chatbots e assistentes virtuais
-- Migração e integração de dados
-- Consultoria em arquitetura de dados"""
-
-            prompt = f"""Você é um assistente especializado da ICTA Technology. Responda de forma útil e profissional.
-
-CONTEXTO DA EMPRESA:
-{icta_context}
-
-PERGUNTA DO CLIENTE: {question}
-
-INSTRUÇÕES:
-- Seja profissional e útil
-- Use informações gerais sobre tecnologia quando apropriado
-- Se não souber algo específico da ICTA, seja honesto
-- Sugira entrar em contato para informações detalhadas
-- Mantenha foco em BI, automação, IA e integrações
+            prompt = f"""{FALLBACK_PROMPT_PREFIX}PERGUNTA DO CLIENTE: {question}
 
 RESPOSTA:"""
 
-            # Tokenizar e gerar resposta
-            inputs = self.tokenizer(
-                prompt, 
-                return_tensors="pt", 
-                max_length=600, 
-                truncation=True
+            # Geração via executor em lotes (compartilha o FLAN-T5 e agrupa pedidos simultâneos).
+            # O prompt inteiro passa pelo encoder: o T5 é bidirecional, então instruções e
+            # pergunta precisam ser codificadas juntas
+            response = get_flan_runner(DEFAULT_CONFIG["generation_model"], self.device).submit(
+                prompt, pad_token_id=self.tokenizer.eos_token_id, **params
             )
             
-            # Mover inputs para dispositivo correto
-            inputs = {k: v.to(self.device) for k, v in inputs.items()}
-            
-            with torch.no_grad():
-                outputs = self.model.generate(
-                    **inputs,
-                    max_new_tokens=800,
-                    temperature=0.7,
-                    do_sample=True,
-                    top_p=0.9,
-                    pad_token_id=self.tokenizer.eos_token_id,
-                    no_repeat_ngram_size=3
-                )
-            
-            response = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-            
             # Limpar resposta (remover prompt repetido)
             response = response.replace(prompt, "").strip()
             
             # Adicionar disclaimer sobre ser resposta geral
             disclaimer = "\n\n💡 *Resposta gerada por IA geral. Para informações específicas da ICTA, entre em contato conosco.*"
             
+            self.cache.put(question, context_type, response + disclaimer, generation)
             return response + disclaimer
             
         except Exception as e:
@@ -183,6 +686,34 @@ RESPOSTA:"""
 # Instância global do sistema de fallback
 flan_fallback = FlanT5Fallback()
 
+# Categoria no início de uma entrada ("[FAQ GERAL] ") e marcador do texto da resposta
+_ENTRY_PREFIX = re.compile(r"^(?:\[[^\]\n]*\]\s*)+")
+_ANSWER_MARKER = re.compile(r"(?:RESPOSTA|CONTEÚDO|TEXTO|INFORMAÇÃO):\s*")
+
+def format_direct_answer(chunk: str, question: str) -> Optional[str]:
+    """Texto da resposta (RESPOSTA/CONTEÚDO) de uma entrada completa do chunk, sem categoria e TAGS
+    
+    Entre as entradas inteiras do chunk, fica a que mais compartilha palavras com a pergunta;
+    None quando nenhuma está completa (ex.: o chunk corta a resposta ao meio).
+    """
+    question_words = set(re.findall(r"\w+", question.lower()))
+    entries = chunk.split("\n\n")
+    best, best_overlap = None, -1
+    for i, entry in enumerate(entries):
+        entry = _ENTRY_PREFIX.sub("", entry.strip())
+        marker = _ANSWER_MARKER.search(entry)
+        if marker is None:
+            continue
+        answer, tags, _ = entry[marker.end():].partition("[TAGS:")
+        answer = answer.strip()
+        # A última entrada só está inteira se terminar nas TAGS (senão o chunk pode tê-la cortado)
+        if not answer or (i == len(entries) - 1 and not tags):
+            continue
+        overlap = len(question_words & set(re.findall(r"\w+", entry.lower())))
+        if overlap > best_overlap:
+            best, best_overlap = answer, overlap
+    return best
+
 class PortugueseLLM:
     """FLAN-T5 otimizado para português com prompts melhorados"""
     
@@ -190,33 +721,35 @@ class PortugueseLLM:
         self.model = None
         self.tokenizer = None
         self.is_loaded = False
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.device = None  # Definido em load_model (evita importar torch na carga do módulo)
+        self.cache = ResponseCache("enhanced")
     
     def load_model(self) -> bool:
         """Carrega o modelo FLAN-T5 otimizado para português"""
         try:
+            self.device = default_device()
             model_name = DEFAULT_CONFIG["generation_model"]
             print(f"🤖 Carregando FLAN-T5 otimizado: {model_name}")
             
             # Usar FLAN-T5 que é mais estável
-            self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-            self.model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+            try:
+                # Mesma instância usada pelo restante do sistema (carregada uma vez)
+                self.tokenizer, self.model = _get_flan(model_name, self.device)
+                if self.device == "cuda":
+                    print(f"  🚀 Modelo carregado na GPU")
+                else:
+                    print(f"  💻 Modelo carregado na CPU")
+            except RuntimeError:
+                if self.device != "cuda":
+                    raise
+                self.device = "cpu"
+                self.tokenizer, self.model = _get_flan(model_name, self.device)
+                print(f"  💻 Modelo carregado na CPU (GPU não disponível)")
             
             # Configurar padding token se não existir
             if self.tokenizer.pad_token is None:
                 self.tokenizer.pad_token = self.tokenizer.eos_token
             
-            # Mover para dispositivo apropriado
-            if self.device == "cuda" and torch.cuda.is_available():
-                try:
-                    self.model = self.model.to(self.device)
-                    print(f"  🚀 Modelo carregado na GPU")
-                except:
-                    self.device = "cpu"
-                    print(f"  💻 Modelo carregado na CPU (GPU não disponível)")
-            else:
-                print(f"  💻 Modelo carregado na CPU")
-            
             self.is_loaded = True
             print("✅ FLAN-T5 otimizado carregado com sucesso!")
             return True
@@ -226,8 +759,37 @@ class PortugueseLLM:
             self.is_loaded = False
             return False
     
-    def generate_enhanced_response(self, question: str, rag_context: str = "") -> str:
+    def generate_enhanced_response(self, question: str, rag_context: str = "", rag_score: float = 0.0,
+                                   top_context: str = "") -> str:
         """Gera resposta usando FLAN-T5 com prompts otimizados para português"""
+        direct_answer = None
+        if rag_context:
+            # Limitar e limpar contexto RAG
+            context_lines = rag_context.split('\n')[:2]  # Usar apenas 2 linhas
+            clean_context = ' '.join(context_lines).strip()
+            clean_context = clean_context.replace('[TAGS:', '').replace(']', '')
+            
+            # Resposta pronta do melhor trecho: com alta confiança dispensa a geração
+            direct_answer = format_direct_answer(top_context or rag_context, question)
+            if direct_answer and rag_score >= DEFAULT_CONFIG.get("rag_confident_threshold", 0.85):
+                return direct_answer
+        
+        # Parâmetros otimizados para FLAN-T5 (guloso: com temperatura 0.3 a amostragem já era
+        # quase determinística; repetition_penalty evita repetição sem o custo do no_repeat_ngram_size)
+        params = dict(
+            input_max_length=400,
+            max_new_tokens=100,  # Quantidade adequada para FLAN-T5
+            do_sample=False,
+            num_beams=1,
+            repetition_penalty=1.1
+        )
+        generation = generation_signature(DEFAULT_CONFIG["generation_model"], params)
+        
+        # Pergunta já respondida com o mesmo contexto: evita nova geração
+        cached = self.cache.get(question, rag_context, generation)
+        if cached is not None:
+            return cached
+        
         try:
             if not self.is_loaded:
                 success = self.load_model()
@@ -236,11 +798,6 @@ class PortugueseLLM:
             
             # Criar prompt otimizado para FLAN-T5 em português
             if rag_context:
-                # Limitar e limpar contexto RAG
-                context_lines = rag_context.split('\n')[:2]  # Usar apenas 2 linhas
-                clean_context = ' '.join(context_lines).strip()
-                clean_context = clean_context.replace('[TAGS:', '').replace(']', '')
-                
                 prompt = f"""Baseado nas informações da ICTA Technology, responda de forma clara e profissional em português.
 
 Informações: {clean_context}
@@ -252,39 +809,17 @@ Resposta clara em português:"""
                 # Prompt para perguntas gerais
                 prompt = f"""Responda como assistente profissional da ICTA Technology em português.
 
-A ICTA Technology é especializada em Business Intelligence, automação de processos e inteligência artificial para empresas.
+{ICTA_SUMMARY}
 
 Pergunta: {question}
 
 Resposta profissional:"""
             
-            # Tokenizar com limite adequado
-            inputs = self.tokenizer(
-                prompt,
-                return_tensors="pt",
-                max_length=400,
-                truncation=True,
-                padding=True
+            # Gerar resposta (executor em lotes compartilhado)
+            response = get_flan_runner(DEFAULT_CONFIG["generation_model"], self.device).submit(
+                prompt, pad_token_id=self.tokenizer.pad_token_id, **params
             )
             
-            inputs = {k: v.to(self.device) for k, v in inputs.items()}
-            
-            # Gerar resposta com parâmetros otimizados para FLAN-T5
-            with torch.no_grad():
-                outputs = self.model.generate(
-                    **inputs,
-                    max_new_tokens=100,  # Quantidade adequada para FLAN-T5
-                    temperature=0.3,     # Conservador para informações específicas
-                    do_sample=True,
-                    top_p=0.8,
-                    repetition_penalty=1.1,
-                    pad_token_id=self.tokenizer.eos_token_id,
-                    no_repeat_ngram_size=2
-                )
-            
-            # Decodificar resposta
-            response = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-            
             # Extrair apenas a resposta nova
             if "Resposta clara em português:" in response:
                 response = response.split("Resposta clara em português:")[-1].strip()
@@ -298,23 +833,26 @@ Resposta profissional:"""
             if len(response) < 15 or len(response) > 400:
                 if rag_context:
                     # Usar resposta direta do RAG se disponível
-                    return clean_context if clean_context else "Entre em contato para mais informações sobre os serviços da ICTA Technology."
+                    return direct_answer or "Entre em contato para mais informações sobre os serviços da ICTA Technology."
                 else:
                     return "A ICTA Technology oferece soluções em Business Intelligence, automação e inteligência artificial. Entre em contato para mais informações."
             
+            self.cache.put(question, rag_context, response, generation)
             return response
             
         except Exception as e:
             print(f"Erro no modelo FLAN-T5: {e}")
             if rag_context:
-                # Fallback para contexto RAG direto
-                clean_context = rag_context.replace('[TAGS:', '').replace(']', '').strip()
-                return clean_context.split('\n')[0] if clean_context else "Entre em contato para mais informações."
+                # Fallback para a resposta direta do melhor trecho
+                return direct_answer or "Entre em contato para mais informações."
             return "Para informações específicas, entre em contato com a ICTA Technology."
 
 # Instância global do modelo português
 portuguese_llm = PortugueseLLM()
 
+# Respostas do generate_answer (RAG direto), por pergunta + documentos recuperados
+rag_answer_cache = ResponseCache("rag")
+
 # ================================
 # Utilitários de Interface
 # ================================
@@ -328,16 +866,24 @@ def print_header():
     print(f"{Fore.GREEN}GitHub: https://github.com/jesseff20/rag-chatbot")
     print(f"{Fore.CYAN}{'='*60}{Style.RESET_ALL}\n")
 
-def print_menu_option(number: int, title: str, description: str):
-    """Imprime uma opção do menu formatada"""
-    print(f"{Fore.YELLOW}{number:2}. {Fore.WHITE}{title}")
-    print(f"    {Fore.LIGHTBLACK_EX}{description}{Style.RESET_ALL}")
+def format_menu_option(number: int, title: str, description: str) -> str:
+    """Opção do menu formatada (número e título, descrição recuada)"""
+    return (f"{Fore.YELLOW}{number:2}. {Fore.WHITE}{title}{Style.RESET_ALL}\n"
+            f"    {Fore.LIGHTBLACK_EX}{description}{Style.RESET_ALL}\n")
+
+def render_menu(title: str, width: int, options: list[tuple[str, str]]) -> str:
+    """Menu completo (título, sublinhado e opções numeradas) para uma única escrita"""
+    lines = [f"\n{Fore.CYAN}{title}{Style.RESET_ALL}\n", f"{Fore.CYAN}{'=' * width}{Style.RESET_ALL}\n"]
+    lines.extend(format_menu_option(number, option, description)
+                 for number, (option, description) in enumerate(options, 1))
+    return "".join(lines)
 
 def get_user_choice(max_option: int) -> int:
     """Obtém escolha do usuário com validação"""
+    prompt = f"\n{Fore.CYAN}🎯 Escolha uma opção (1-{max_option}): {Style.RESET_ALL}"
     while True:
         try:
-            choice = input(f"\n{Fore.CYAN}🎯 Escolha uma opção (1-{max_option}): {Style.RESET_ALL}")
+            choice = input(prompt)
             choice_num = int(choice)
             if 1 <= choice_num <= max_option:
                 return choice_num
@@ -349,13 +895,17 @@ def get_user_choice(max_option: int) -> int:
             print(f"\n{Fore.YELLOW}👋 Saindo do programa...")
             sys.exit(0)
 
+_YES_ANSWERS = frozenset({'s', 'sim', 'y', 'yes'})
+_NO_ANSWERS = frozenset({'n', 'nao', 'não', 'no'})
+
 def confirm_action(message: str) -> bool:
     """Confirma uma ação com o usuário"""
+    prompt = f"{Fore.YELLOW}❓ {message} (s/n): {Style.RESET_ALL}"
     while True:
-        response = input(f"{Fore.YELLOW}❓ {message} (s/n): {Style.RESET_ALL}").lower().strip()
-        if response in ['s', 'sim', 'y', 'yes']:
+        response = input(prompt).lower().strip()
+        if response in _YES_ANSWERS:
             return True
-        elif response in ['n', 'nao', 'não', 'no']:
+        elif response in _NO_ANSWERS:
             return False
         else:
             print(f"{Fore.RED}❌ Digite 's' para sim ou 'n' para não")
@@ -368,6 +918,20 @@ def wait_for_enter():
 # Utilitários de Processamento
 # ================================
 
+def iter_jsonl_files(folder: str):
+    """Percorre o diretório com os.scandir retornando (caminho, stat) dos .jsonl"""
+    stack = [folder]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            subdirs = []
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.name[-6:].lower() == ".jsonl":  # Só o sufixo em minúsculas
+                    # DirEntry reaproveita o stat da listagem (sem syscall extra no Windows)
+                    yield entry.path, entry.stat()
+            stack.extend(reversed(subdirs))
+
 def read_jsonl_files(folder: str) -> dict[str, str]:
     """Lê todos os .jsonl do diretório com processamento inteligente"""
     print(f"{Fore.BLUE}📂 Lendo arquivos .jsonl de: {folder}")
@@ -377,12 +941,7 @@ def read_jsonl_files(folder: str) -> dict[str, str]:
         return {}
     
     data: dict[str, str] = {}
-    jsonl_files = []
-    
-    for root, _, files in os.walk(folder):
-        for f in files:
-            if f.lower().endswith(".jsonl"):
-                jsonl_files.append(os.path.join(root, f))
+    jsonl_files = list(iter_jsonl_files(folder))
     
     if not jsonl_files:
         print(f"{Fore.YELLOW}⚠️ Nenhum arquivo .jsonl encontrado em {folder}")
@@ -390,50 +949,170 @@ def read_jsonl_files(folder: str) -> dict[str, str]:
     
     print(f"{Fore.GREEN}📄 Encontrados {len(jsonl_files)} arquivos .jsonl")
     
-    for fp in tqdm(jsonl_files, desc="Lendo arquivos"):
-        try:
-            content_parts = []
-            with open(fp, "r", encoding="utf-8") as fh:
-                for line in fh:
-                    line = line.strip()
-                    if line:
-                        entry = json.loads(line)
-                        # Processa e enriquece cada entrada
-                        processed_entry = process_jsonl_entry(entry, os.path.basename(fp))
-                        if processed_entry:
-                            content_parts.append(processed_entry)
-                        
-            if content_parts:
-                content = "\n\n".join(content_parts)
+    # Arquivos sem alteração desde a última leitura vêm prontos do cache
+    cache = load_ingest_cache()
+    cached: dict[str, tuple[int, str]] = {}
+    pending = []
+    for fp, st in jsonl_files:
+        hit = cache.get(fp)
+        if st.st_size and hit is not None and hit[:2] == (st.st_mtime_ns, st.st_size):
+            cached[fp] = hit[2:]
+        else:
+            pending.append((fp, st))
+    if cached:
+        print(f"{Fore.CYAN}♻️ {len(cached)} arquivo(s) sem alterações reaproveitados do cache")
+    
+    # Parse + enriquecimento das entradas é CPU (preso ao GIL): com vários arquivos usa
+    # processos; com poucos, threads bastam e evitam o custo de criar processos.
+    # Em ambos os casos os resultados são consumidos na ordem dos arquivos
+    cpus = os.cpu_count() or 1
+    non_empty = sum(1 for _, st in pending if st.st_size)
+    if non_empty >= 4 and cpus > 1:
+        executor = ProcessPoolExecutor(max_workers=min(cpus, non_empty))
+    else:
+        executor = ThreadPoolExecutor(max_workers=min(32, cpus * 4, len(jsonl_files)))
+    with executor:
+        submitted = {fp: executor.submit(_read_jsonl_file, fp) for fp, st in pending if st.st_size}
+        
+        # Status por arquivo vai para um buffer e sai numa única escrita após a barra
+        # de progresso (print em loop é caro no console do Windows e quebra o tqdm)
+        green, yellow, red = Fore.GREEN, Fore.YELLOW, Fore.RED
+        status: list[str] = []
+        for fp, st in tqdm(jsonl_files, desc="Lendo arquivos"):
+            name = os.path.basename(fp)
+            if fp in cached:
+                entries, content = cached[fp]
+            elif fp in submitted:
+                try:
+                    content_parts = submitted[fp].result()
+                except Exception as e:
+                    status.append(f"{red}  ❌ Erro ao ler {name}: {e}")
+                    continue
+                entries, content = len(content_parts), "\n\n".join(content_parts)
+                cache[fp] = (st.st_mtime_ns, st.st_size, entries, content)
+            else:
+                entries, content = 0, ""
+            
+            if content:
                 data[fp] = content
-                print(f"{Fore.GREEN}  ✅ {os.path.basename(fp)} ({len(content_parts)} entradas, {len(content)} caracteres)")
+                status.append(f"{green}  ✅ {name} ({entries} entradas, {len(content)} caracteres)")
             else:
-                print(f"{Fore.YELLOW}  ⚠️ {os.path.basename(fp)} está vazio")
-        except Exception as e:
-            print(f"{Fore.RED}  ❌ Erro ao ler {os.path.basename(fp)}: {e}")
+                status.append(f"{yellow}  ⚠️ {name} está vazio")
+    
+    if status:
+        sys.stdout.write("\n".join(status) + Style.RESET_ALL + "\n")
     
+    if submitted:
+        # Mantém só os arquivos que ainda existem
+        save_ingest_cache({fp: cache[fp] for fp, _ in jsonl_files if fp in cache})
     return data
 
+# Incrementar quando process_jsonl_entry mudar (invalida o conteúdo em cache)
+_INGEST_CACHE_VERSION = 1
+
+def ingest_cache_path() -> str:
+    """Cache do conteúdo processado dos .jsonl, ao lado do índice"""
+    return os.path.join(os.path.dirname(DEFAULT_CONFIG["index_path"]), "ingest_cache.pkl")
+
+def load_ingest_cache() -> dict[str, tuple]:
+    """Lê o cache de ingestão: caminho -> (mtime_ns, tamanho, nº de entradas, conteúdo)"""
+    try:
+        with open(ingest_cache_path(), "rb") as f:
+            version, cache = pickle.load(f)
+        return cache if version == _INGEST_CACHE_VERSION else {}
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+        return {}
+
+def save_ingest_cache(cache: dict[str, tuple]):
+    """Grava o cache de ingestão (falhas são ignoradas: o cache é opcional)"""
+    try:
+        os.makedirs(os.path.dirname(ingest_cache_path()) or ".", exist_ok=True)
+        with open(ingest_cache_path(), "wb") as f:
+            pickle.dump((_INGEST_CACHE_VERSION, cache), f, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError:
+        pass
+
+def _read_jsonl_file(fp: str) -> list[str]:
+    """Lê um arquivo .jsonl e retorna suas entradas já processadas"""
+    content_parts = []
+    filename = os.path.basename(fp)
+    # Arquivo mapeado em memória: as linhas saem direto das páginas do arquivo (sem cópia
+    # para um buffer de leitura) e o parser (orjson) decodifica o UTF-8 direto dos bytes
+    with open(fp, "rb") as fh:
+        if os.fstat(fh.fileno()).st_size == 0:
+            return content_parts
+        with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for line in iter(mm.readline, b""):
+                if not line.isspace():
+                    try:
+                        entry = json_loads(line)
+                    except ValueError:
+                        # Bytes fora do UTF-8 (ex.: arquivo salvo em Latin-1) só afetam os
+                        # caracteres inválidos, não descartam o arquivo inteiro
+                        entry = json_loads(line.decode("utf-8", errors="replace"))
+                    # Processa e enriquece cada entrada
+                    processed_entry = process_jsonl_entry(entry, filename)
+                    if processed_entry:
+                        content_parts.append(processed_entry)
+    return content_parts
+
+def keyword_matcher(groups: dict[str, list[str]]):
+    """Compila uma regex única que devolve os rótulos de todas as palavras-chave presentes no texto"""
+    label_of = {word: label for label, words in groups.items() for word in words}
+    # Lookahead de largura zero: testa todas as posições, inclusive trechos sobrepostos
+    # ("api" e "ia" em "terapia"); mais longas primeiro quando começam no mesmo ponto
+    alternatives = "|".join(re.escape(word) for word in sorted(label_of, key=len, reverse=True))
+    pattern = re.compile(f"(?=({alternatives}))")
+    
+    def labels(text: str) -> set[str]:
+        return {label_of[match] for match in pattern.findall(text)}
+    return labels
+
+# Categoria do conteúdo das respostas sem pergunta (ordem = prioridade)
+_CONTENT_PREFIX_KEYWORDS = {
+    "[SAUDAÇÃO] ": ['bom dia', 'boa tarde', 'boa noite', 'olá', 'oi'],
+    "[PREÇOS/COMERCIAL] ": ['preço', 'custo', 'investimento', 'valor'],
+    "[INTEGRAÇÃO/ERP] ": ['totvs', 'erp', 'integração'],
+    "[BUSINESS INTELLIGENCE] ": ['bi', 'business intelligence', 'dashboard', 'relatório'],
+    "[AUTOMAÇÃO] ": ['automação', 'rpa', 'processo'],
+    "[INTELIGÊNCIA ARTIFICIAL] ": ['ia', 'inteligência artificial', 'chatbot', 'ai'],
+    "[CONTATO/LOCALIZAÇÃO] ": ['contato', 'telefone', 'email', 'endereço'],
+}
+
+# Palavras-chave técnicas anexadas como TAGS
+_TAG_KEYWORDS = {
+    "business_intelligence": ['dashboard', 'relatório', 'análise', 'dados'],
+    "automacao_processos": ['automação', 'automatizar', 'processo'],
+    "integracao_erp": ['totvs', 'erp', 'protheus'],
+    "inteligencia_artificial": ['chatbot', 'ia', 'inteligência'],
+    "tecnologia": ['python', 'sql', 'api'],
+}
+
+_CONTENT_PREFIX_MATCHER = keyword_matcher(_CONTENT_PREFIX_KEYWORDS)
+_TAG_MATCHER = keyword_matcher(_TAG_KEYWORDS)
+
 def process_jsonl_entry(entry: dict, filename: str) -> str:
     """Processa uma entrada JSONL para enriquecer o contexto"""
     
     # Determina o contexto baseado no nome do arquivo
     context_prefix = ""
-    if "cortesia" in filename.lower() or "saudacao" in filename.lower():
+    name = filename.lower()
+    if "cortesia" in name or "saudacao" in name:
         context_prefix = "[SAUDAÇÃO/CORTESIA] "
-    elif "empresa" in filename.lower() or "contato" in filename.lower():
+    elif "empresa" in name or "contato" in name:
         context_prefix = "[EMPRESA/CONTATO] "
-    elif "faq" in filename.lower():
+    elif "faq" in name:
         context_prefix = "[FAQ GERAL] "
-    elif "servicos" in filename.lower() or "bi" in filename.lower() or "automacao" in filename.lower():
+    elif "servicos" in name or "bi" in name or "automacao" in name:
         context_prefix = "[SERVIÇOS/BI/AUTOMAÇÃO] "
-    elif "integracao" in filename.lower() or "totvs" in filename.lower():
+    elif "integracao" in name or "totvs" in name:
         context_prefix = "[INTEGRAÇÃO/TOTVS] "
-    elif "politica" in filename.lower():
+    elif "politica" in name:
         context_prefix = "[POLÍTICA/DIRETRIZES] "
     
     # Processa diferentes estruturas de entrada
     processed_text = ""
+    text_lower = ""  # processed_text em minúsculas, quando já calculado
     
     if 'question' in entry and 'answer' in entry:
         # Formato completo com pergunta e resposta
@@ -442,23 +1121,13 @@ def process_jsonl_entry(entry: dict, filename: str) -> str:
         # Apenas resposta - tenta inferir o contexto
         answer = entry['answer'].strip()
         
-        # Adiciona contexto semântico baseado no conteúdo
-        if any(word in answer.lower() for word in ['bom dia', 'boa tarde', 'boa noite', 'olá', 'oi']):
-            context_prefix = "[SAUDAÇÃO] "
-        elif any(word in answer.lower() for word in ['preço', 'custo', 'investimento', 'valor']):
-            context_prefix = "[PREÇOS/COMERCIAL] "
-        elif any(word in answer.lower() for word in ['totvs', 'erp', 'integração']):
-            context_prefix = "[INTEGRAÇÃO/ERP] "
-        elif any(word in answer.lower() for word in ['bi', 'business intelligence', 'dashboard', 'relatório']):
-            context_prefix = "[BUSINESS INTELLIGENCE] "
-        elif any(word in answer.lower() for word in ['automação', 'rpa', 'processo']):
-            context_prefix = "[AUTOMAÇÃO] "
-        elif any(word in answer.lower() for word in ['ia', 'inteligência artificial', 'chatbot', 'ai']):
-            context_prefix = "[INTELIGÊNCIA ARTIFICIAL] "
-        elif any(word in answer.lower() for word in ['contato', 'telefone', 'email', 'endereço']):
-            context_prefix = "[CONTATO/LOCALIZAÇÃO] "
+        # Adiciona contexto semântico baseado no conteúdo (primeira categoria encontrada, em ordem de prioridade)
+        answer_lower = answer.lower()
+        found = _CONTENT_PREFIX_MATCHER(answer_lower)
+        context_prefix = next((label for label in _CONTENT_PREFIX_KEYWORDS if label in found), context_prefix)
         
         processed_text = f"CONTEÚDO: {answer}"
+        text_lower = f"conteúdo: {answer_lower}"  # Reaproveita a resposta já em minúsculas
     elif 'text' in entry:
         processed_text = f"TEXTO: {entry['text']}"
     elif isinstance(entry, str):
@@ -469,139 +1138,244 @@ def process_jsonl_entry(entry: dict, filename: str) -> str:
     # Adiciona metadados para melhor recuperação
     enhanced_text = f"{context_prefix}{processed_text}"
     
-    # Adiciona palavras-chave relevantes para ICTA
-    keywords = []
-    text_lower = processed_text.lower()
-    
-    # Palavras-chave técnicas
-    if any(word in text_lower for word in ['dashboard', 'relatório', 'análise', 'dados']):
-        keywords.append("business_intelligence")
-    if any(word in text_lower for word in ['automação', 'automatizar', 'processo']):
-        keywords.append("automacao_processos")
-    if any(word in text_lower for word in ['totvs', 'erp', 'protheus']):
-        keywords.append("integracao_erp")
-    if any(word in text_lower for word in ['chatbot', 'ia', 'inteligência']):
-        keywords.append("inteligencia_artificial")
-    if any(word in text_lower for word in ['python', 'sql', 'api']):
-        keywords.append("tecnologia")
+    # Adiciona palavras-chave relevantes para ICTA (uma única varredura do texto)
+    found = _TAG_MATCHER(text_lower or processed_text.lower())
+    keywords = [label for label in _TAG_KEYWORDS if label in found]
     
     if keywords:
         enhanced_text += f" [TAGS: {', '.join(keywords)}]"
     
     return enhanced_text
 
+def json_loads(data: bytes | str) -> Any:
+    """Desserializa JSON (orjson quando disponível; aceita espaços e quebra de linha ao redor)"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+def read_json_file(path: str) -> Any:
+    """Lê um arquivo JSON inteiro de uma vez"""
+    with open(path, "rb") as f:
+        return json_loads(f.read())
+
+def write_json_file(path: str, data: Any):
+    """Grava JSON indentado (legível) em UTF-8, via orjson quando disponível"""
+    if orjson is not None:
+        with open(path, "wb") as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+def json_line(record: dict) -> bytes:
+    """Serializa um registro como linha JSONL em UTF-8 (orjson quando disponível)"""
+    if orjson is not None:
+        return orjson.dumps(record) + b"\n"
+    return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+def count_lines(path: str) -> int:
+    """Conta linhas lendo blocos binários de 1 MiB, sem decodificar UTF-8"""
+    n = 0
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            block = f.read(1 << 20)
+            if not block:
+                return n
+            n += block.count(b"\n")
+
 def chunk_text(text: str, chunk_size: int = 400, overlap: int = 80) -> list[str]:
     """Quebra texto em chunks inteligentes com sobreposição otimizada"""
-    import re
-    
-    chunks = []
-    
-    # Primeiro, tenta quebrar por sentenças completas
-    sentences = re.split(r'(?<=[.!?])\s+', text)
-    if not sentences:
-        sentences = [text]
-    
-    current_chunk = ""
-    
-    for sentence in sentences:
+    return [chunk for chunk, _, _ in chunk_text_with_offsets(text, chunk_size, overlap)]
+
+def chunk_documents_by_tokens(texts: list[str], tokenizer, max_tokens: int = 256,
+                              overlap: int = 32) -> list[list[tuple[str, int, int]]]:
+    """Divide documentos em janelas de tokens do encoder, devolvendo (chunk, início, fim) em caracteres"""
+    # Em lote o tokenizer rápido (Rust) distribui os documentos entre os núcleos
+    encodings = tokenizer(texts, add_special_tokens=False, return_offsets_mapping=True,
+                          truncation=False, verbose=False)
+    return [token_windows(text, offsets, max_tokens, overlap)
+            for text, offsets in zip(texts, encodings["offset_mapping"])]
+
+def token_windows(text: str, token_offsets, max_tokens: int, overlap: int) -> list[tuple[str, int, int]]:
+    """Janelas de até max_tokens tokens (com sobreposição) que começam e terminam em fronteiras de palavra"""
+    n = len(token_offsets)
+    if not n:
+        return []
+    # Token que inicia palavra: segue um espaço/quebra de linha (ou um buraco entre offsets,
+    # quando o tokenizer não inclui o espaço no token)
+    word_start = [False] * (n + 1)
+    word_start[0] = word_start[n] = True
+    for i in range(1, n):
+        begin = token_offsets[i][0]
+        word_start[i] = (begin > token_offsets[i - 1][1] or text[begin - 1:begin].isspace()
+                         or text[begin:begin + 1].isspace())
+    
+    spans: list[tuple[str, int, int]] = []
+    start = 0
+    while start < n:
+        end = min(start + max_tokens, n)
+        # Recua o fim até o início de uma palavra (palavra maior que a janela fica cortada)
+        cut = end
+        while cut > start + 1 and not word_start[cut]:
+            cut -= 1
+        if word_start[cut]:
+            end = cut
+        
+        start_char, end_char = token_offsets[start][0], token_offsets[end - 1][1]
+        raw = text[start_char:end_char]
+        chunk = raw.strip()
+        if chunk:
+            # Offsets de alguns tokenizers incluem o espaço anterior à palavra
+            start_char += len(raw) - len(raw.lstrip())
+            spans.append((chunk, start_char, start_char + len(chunk)))
+        if end == n:
+            break
+        # Próxima janela: overlap tokens antes do fim, avançando até o início de uma palavra
+        next_start = max(start + 1, end - overlap)
+        while next_start < end and not word_start[next_start]:
+            next_start += 1
+        start = next_start
+    return spans
+
+# Fronteira de sentença e pontuação solta no início da sobreposição (compiladas uma vez)
+_SENT_SPLIT = re.compile(r'(?<=[.!?])\s+')
+_LEAD_PUNCT = re.compile(r'^[^\w\s]*')
+_WORD = re.compile(r'\S+')
+
+def iter_chunk_offsets(n: int, chunk_size: int, overlap: int):
+    """(início, fim) de janelas de chunk_size caracteres com sobreposição, sem copiar o texto"""
+    step = max(1, chunk_size - overlap)
+    for start in range(0, max(1, n - overlap), step):
+        yield start, min(start + chunk_size, n)
+
+def chunk_text_with_offsets(text: str, chunk_size: int = 400, overlap: int = 80) -> list[tuple[str, int, int]]:
+    """Quebra texto em chunks e retorna (chunk, start_char, end_char) relativos ao texto original"""
+    spans: list[tuple[str, int, int]] = []
+    
+    def emit(chunk: str, start: int, end: int):
+        """Guarda o chunk sem espaços nas bordas, ajustando os offsets"""
+        stripped = chunk.strip()
+        if stripped:
+            lead = len(chunk) - len(chunk.lstrip())
+            trail = len(chunk) - len(chunk.rstrip())
+            spans.append((stripped, start + lead, end - trail))
+    
+    def sentence_spans():
+        """(início, fim) de cada sentença no texto, sem materializar a lista de sentenças"""
+        pos = 0
+        for sep in _SENT_SPLIT.finditer(text):
+            yield pos, sep.start()
+            pos = sep.end()
+        yield pos, len(text)
+    
+    def join_spans(parts: list[tuple[int, int]]) -> str:
+        """Monta o chunk (partes unidas por um espaço) fatiando o texto uma única vez por parte"""
+        return " ".join([text[a:b] for a, b in parts])
+    
+    # Primeiro, tenta quebrar por sentenças completas. O chunk atual é só uma lista de
+    # intervalos do texto original e o tamanho que a união teria
+    current_parts: list[tuple[int, int]] = []
+    current_len = 0
+    cur_start = cur_end = 0
+    
+    for s_start, s_end in sentence_spans():
+        s_len = s_end - s_start
+        
         # Se adicionar a próxima sentença não exceder o limite
-        if len(current_chunk + " " + sentence) <= chunk_size:
-            if current_chunk:
-                current_chunk += " " + sentence
+        if current_len + 1 + s_len <= chunk_size:
+            if current_len:
+                current_parts.append((s_start, s_end))
+                current_len += 1 + s_len
             else:
-                current_chunk = sentence
+                current_parts = [(s_start, s_end)]
+                current_len = s_len
+                cur_start = s_start
+            cur_end = s_end
         else:
             # Se o chunk atual não está vazio, salva
-            if current_chunk.strip():
-                chunks.append(current_chunk.strip())
+            emit(join_spans(current_parts), cur_start, cur_end)
             
             # Se a sentença é muito longa, quebra por caracteres
-            if len(sentence) > chunk_size:
+            if s_len > chunk_size:
                 # Quebra a sentença longa mantendo palavras inteiras
-                words = sentence.split()
-                temp_chunk = ""
-                for word in words:
-                    if len(temp_chunk + " " + word) <= chunk_size:
-                        if temp_chunk:
-                            temp_chunk += " " + word
+                temp_parts: list[tuple[int, int]] = []
+                temp_len = 0
+                t_start = t_end = s_start
+                for word in _WORD.finditer(text, s_start, s_end):
+                    w_start, w_end = word.span()
+                    w_len = w_end - w_start
+                    if temp_len + 1 + w_len <= chunk_size:
+                        if temp_len:
+                            temp_parts.append((w_start, w_end))
+                            temp_len += 1 + w_len
                         else:
-                            temp_chunk = word
+                            temp_parts = [(w_start, w_end)]
+                            temp_len = w_len
+                            t_start = w_start
+                        t_end = w_end
                     else:
-                        if temp_chunk.strip():
-                            chunks.append(temp_chunk.strip())
-                        temp_chunk = word
+                        emit(join_spans(temp_parts), t_start, t_end)
+                        temp_parts, temp_len = [(w_start, w_end)], w_len
+                        t_start, t_end = w_start, w_end
                 
-                current_chunk = temp_chunk
+                current_parts, current_len = temp_parts, temp_len
+                cur_start, cur_end = t_start, t_end
             else:
-                current_chunk = sentence
+                current_parts, current_len = [(s_start, s_end)], s_len
+                cur_start, cur_end = s_start, s_end
     
     # Adiciona o último chunk se não estiver vazio
-    if current_chunk.strip():
-        chunks.append(current_chunk.strip())
+    emit(join_spans(current_parts), cur_start, cur_end)
     
     # Se ainda não temos chunks, faz quebra simples por caracteres
-    if not chunks and text.strip():
-        start = 0
-        n = len(text)
-        while start < n:
-            end = min(start + chunk_size, n)
-            chunk = text[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
-            if end == n:
-                break
-            start = end - overlap
-            if start < 0:
-                start = 0
-    
-    # Adiciona sobreposição inteligente entre chunks adjacentes
-    enhanced_chunks = []
-    for i, chunk in enumerate(chunks):
-        if i == 0:
-            enhanced_chunks.append(chunk)
-        else:
-            # Adiciona sobreposição com o chunk anterior
-            prev_chunk = chunks[i-1]
-            overlap_text = prev_chunk[-overlap:] if len(prev_chunk) > overlap else prev_chunk
-            
-            # Remove pontuação quebrada no início da sobreposição
-            overlap_text = re.sub(r'^[^\w\s]*', '', overlap_text)
-            
-            if overlap_text.strip() and not chunk.startswith(overlap_text.strip()):
-                enhanced_chunk = overlap_text.strip() + " " + chunk
-            else:
-                enhanced_chunk = chunk
-            
-            enhanced_chunks.append(enhanced_chunk)
-    
-    return enhanced_chunks
+    if not spans and text.strip():
+        for start, end in iter_chunk_offsets(len(text), chunk_size, overlap):
+            emit(text[start:end], start, end)
+    
+    # Adiciona sobreposição inteligente entre chunks adjacentes. De trás para frente e na
+    # própria lista (sem uma segunda cópia de todos os chunks): quando spans[i] é
+    # reescrito, spans[i-1] ainda é o chunk original
+    for i in range(len(spans) - 1, 0, -1):
+        chunk, start, end = spans[i]
+        # Adiciona sobreposição com o chunk anterior
+        prev_chunk, prev_start, prev_end = spans[i-1]
+        overlap_text = prev_chunk[-overlap:] if len(prev_chunk) > overlap else prev_chunk
+        
+        # Remove pontuação quebrada no início da sobreposição (nada a remover
+        # quando já começa por letra ou dígito)
+        if overlap_text and not overlap_text[0].isalnum():
+            overlap_text = _LEAD_PUNCT.sub('', overlap_text)
+        overlap_clean = overlap_text.strip()
+        
+        if overlap_clean and not chunk.startswith(overlap_clean):
+            # Recua no texto original até cobrir os caracteres visíveis da sobreposição
+            remaining = sum(1 for ch in overlap_text if not ch.isspace())
+            start = prev_end
+            while remaining > 0 and start > prev_start:
+                start -= 1
+                if not text[start].isspace():
+                    remaining -= 1
+            spans[i] = (overlap_clean + " " + chunk, start, end)
+    
+    return spans
 
 # ================================
 # Menu Principal
 # ================================
 
+# Menus fixos: montados uma vez na carga do módulo, redesenhados com uma só escrita
+_MAIN_MENU = render_menu("📋 MENU PRINCIPAL", 50, [
+    ("🏗️ Construir Base de Conhecimento", "Processa seus arquivos .jsonl e cria o índice de busca"),
+    ("💬 Chat Interativo Inteligente", "Conversa inteligente com IA que guia quando necessário"),
+    ("📊 Verificar Status do Sistema", "Mostra informações sobre arquivos e configurações"),
+    ("⚙️ Configurações", "Ajustar parâmetros básicos do sistema"),
+    ("📚 Ajuda", "Guias, exemplos e solução de problemas"),
+    ("🚪 Sair", "Encerra o programa"),
+])
+
 def show_main_menu():
     """Exibe o menu principal"""
-    print(f"\n{Fore.CYAN}📋 MENU PRINCIPAL")
-    print(f"{Fore.CYAN}{'='*50}")
-    
-    print_menu_option(1, "🏗️ Construir Base de Conhecimento", 
-                     "Processa seus arquivos .jsonl e cria o índice de busca")
-    
-    print_menu_option(2, "💬 Chat Interativo Inteligente", 
-                     "Conversa inteligente com IA que guia quando necessário")
-    
-    print_menu_option(3, "📊 Verificar Status do Sistema", 
-                     "Mostra informações sobre arquivos e configurações")
-    
-    print_menu_option(4, "⚙️ Configurações", 
-                     "Ajustar parâmetros básicos do sistema")
-    
-    print_menu_option(5, "📚 Ajuda", 
-                     "Guias, exemplos e solução de problemas")
-    
-    print_menu_option(6, "🚪 Sair", 
-                     "Encerra o programa")
+    sys.stdout.write(_MAIN_MENU)
 
 # ================================
 # Sistema de Status
@@ -648,7 +1422,8 @@ def check_system_status():
     if os.path.exists(config["index_path"]):
         print(f"  ✅ Índice FAISS: {config['index_path']}")
         try:
-            index = faiss.read_index(config["index_path"])
+            # Mapeado em memória: ler ntotal só toca o cabeçalho do arquivo
+            index = read_faiss_index(config["index_path"])
             print(f"  📊 Vetores no índice: {index.ntotal}")
         except Exception as e:
             print(f"  ⚠️ Erro ao ler índice: {e}")
@@ -658,8 +1433,7 @@ def check_system_status():
     if os.path.exists(config["meta_path"]):
         print(f"  ✅ Metadados: {config['meta_path']}")
         try:
-            with open(config["meta_path"], 'r', encoding='utf-8') as f:
-                lines = sum(1 for _ in f)
+            lines = count_meta_records(config["meta_path"])
             print(f"  📊 Chunks de texto: {lines}")
         except Exception as e:
             print(f"  ⚠️ Erro ao ler metadados: {e}")
@@ -671,10 +1445,11 @@ def check_system_status():
     if os.path.exists(config["settings_path"]):
         print(f"  ✅ Arquivo de configurações existe")
         try:
-            with open(config["settings_path"], 'r', encoding='utf-8') as f:
-                settings = json.load(f)
+            settings = read_json_file(config["settings_path"])
             print(f"  📊 Modelo de embeddings: {settings.get('embedding_model', 'N/A')}")
             print(f"  📊 Dimensão: {settings.get('dimension', 'N/A')}")
+            print(f"  📊 Tipo de índice: {settings.get('index_type', 'flat')} ({settings.get('quantization', 'none')})")
+            print(f"  📊 Chunking: {settings.get('chunk_strategy', 'chars')} ({describe_chunking(settings)})")
             print(f"  📊 Criado em: {settings.get('created_at', 'N/A')}")
         except Exception as e:
             print(f"  ⚠️ Erro ao ler configurações: {e}")
@@ -696,8 +1471,157 @@ def check_system_status():
 # Construção de Base de Conhecimento
 # ================================
 
+def create_faiss_index(embeddings_array: np.ndarray, config: dict) -> tuple[Any, dict[str, Any]]:
+    """Cria o índice FAISS adequado ao tamanho do corpus (embeddings já normalizados)"""
+    import faiss  # type: ignore
+    
+    n, dimension = embeddings_array.shape
+    quantization = config.get("index_quantization", "none")
+    sq_type = getattr(faiss.ScalarQuantizer, _SQ_TYPES[quantization]) if quantization in _SQ_TYPES else None
+    
+    if n < config["hnsw_threshold"]:
+        # Busca exaustiva: exata e rápida o suficiente para bases pequenas
+        if sq_type is None:
+            index = faiss.IndexFlatIP(dimension)  # Inner Product (cosine similarity)
+        else:
+            # Vetores quantizados: menos bytes varridos por consulta
+            index = faiss.IndexScalarQuantizer(dimension, sq_type, faiss.METRIC_INNER_PRODUCT)
+        index_settings = {"index_type": "flat"}
+    elif n < config["ivf_threshold"]:
+        # Grafo HNSW: busca sub-linear para bases grandes
+        if sq_type is None:
+            index = faiss.IndexHNSWFlat(dimension, config["hnsw_m"], faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexHNSWSQ(dimension, sq_type, config["hnsw_m"], faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = config["hnsw_ef_construction"]
+        index_settings = {"index_type": "hnsw", "ef_search": config["hnsw_ef_search"]}
+    else:
+        # IVF: particiona o espaço em nlist células e cada consulta varre só nprobe delas;
+        # constrói bem mais rápido que o grafo HNSW e ocupa menos memória
+        nlist = max(64, math.isqrt(n))
+        quantizer = faiss.IndexFlatIP(dimension)
+        if sq_type is None:
+            index = faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexIVFScalarQuantizer(quantizer, dimension, nlist, sq_type,
+                                                  faiss.METRIC_INNER_PRODUCT)
+        # O k-means só precisa de uma amostra: treinar com todos os vetores custaria minutos
+        sample_size = min(n, nlist * config["ivf_train_per_list"])
+        sample = np.random.default_rng(0).choice(n, sample_size, replace=False)
+        index.train(embeddings_array[np.sort(sample)])
+        index_settings = {"index_type": "ivf", "nprobe": max(1, nlist // 16)}
+    
+    # Quantizadores int8 precisam aprender a faixa de valores de cada dimensão
+    if not index.is_trained:
+        index.train(embeddings_array)
+    index.add(embeddings_array)
+    
+    index_settings["quantization"] = quantization if sq_type is not None else "none"
+    # Scores da busca são produtos internos de vetores normalizados (cosseno)
+    index_settings["metric"] = "inner_product"
+    return index, index_settings
+
+def encode_corpus(model: "SentenceTransformer", texts: list[str], batch_size: int, config: dict) -> np.ndarray:
+    """Embeddings (float32, sem normalizar) dos textos: vários processos em bases grandes só com CPU"""
+    cpu_workers = min(4, os.cpu_count() or 1)
+    
+    # Subir o pool recarrega o modelo em cada processo (segundos): só compensa em bases grandes
+    # (pesos INT8 empacotados não são transferíveis para os processos filhos)
+    if (model.device.type == "cpu" and cpu_workers >= 4 and not encoder_is_int8(model)
+            and len(texts) >= config["multiprocess_min_chunks"]):
+        # Só CPU: distribui os lotes entre processos, dividindo os núcleos entre eles
+        # (OMP_NUM_THREADS é herdado pelos processos filhos na inicialização do torch)
+        print(f"  🧵 Usando {cpu_workers} processos de CPU")
+        omp_threads = os.environ.get("OMP_NUM_THREADS")
+        os.environ["OMP_NUM_THREADS"] = str(max(1, (os.cpu_count() or cpu_workers) // cpu_workers))
+        try:
+            pool = model.start_multi_process_pool(target_devices=["cpu"] * cpu_workers)
+        finally:
+            if omp_threads is None:
+                del os.environ["OMP_NUM_THREADS"]
+            else:
+                os.environ["OMP_NUM_THREADS"] = omp_threads
+        try:
+            embeddings_array = model.encode_multi_process(texts, pool, batch_size=batch_size,
+                                                          normalize_embeddings=False)
+        finally:
+            model.stop_multi_process_pool(pool)
+        # FAISS exige float32
+        return np.ascontiguousarray(embeddings_array, dtype=np.float32)
+    else:
+        # Uma única chamada: a biblioteca ordena todos os chunks por comprimento antes de
+        # montar os lotes (menos padding) e devolve direto a matriz numpy
+        embeddings_array = model.encode(texts, batch_size=batch_size, show_progress_bar=True,
+                                        convert_to_numpy=True, normalize_embeddings=False)
+        # FAISS exige float32 (sem cópia quando já é)
+        return np.ascontiguousarray(embeddings_array, dtype=np.float32)
+
+# Incrementar quando o formato do cache de embeddings mudar
+_EMBEDDING_CACHE_VERSION = 1
+_CHUNK_DIGEST_SIZE = 16  # Bytes do blake2b de cada chunk
+
+def embedding_cache_path() -> str:
+    """Cache dos embeddings dos chunks (por hash do texto), ao lado do índice"""
+    return os.path.join(os.path.dirname(DEFAULT_CONFIG["index_path"]), "emb_cache.npz")
+
+def embedding_cache_tag(model_name: str, model: "SentenceTransformer") -> str:
+    """Identifica quem gerou os vetores: modelo, backend e precisão dos pesos"""
+    param = next(model.parameters(), None)
+    if param is None:
+        precision = DEFAULT_CONFIG.get("embedding_backend", "torch")
+    else:
+        precision = "int8" if encoder_is_int8(model) else str(param.dtype)
+    return f"{_EMBEDDING_CACHE_VERSION}|{model_name}|{precision}"
+
+def load_embedding_cache(tag: str) -> tuple[dict[bytes, int], Optional[np.ndarray]]:
+    """Lê o cache de embeddings: hash do chunk -> linha da matriz (vazio se for de outro modelo)"""
+    try:
+        with np.load(embedding_cache_path(), allow_pickle=False) as data:
+            if str(data["tag"]) != tag:
+                return {}, None
+            keys, vectors = data["keys"].tobytes(), data["vectors"]
+    except (OSError, KeyError, ValueError):
+        return {}, None
+    size = _CHUNK_DIGEST_SIZE
+    return {keys[i * size:(i + 1) * size]: i for i in range(len(vectors))}, vectors
+
+def save_embedding_cache(tag: str, digests: list[bytes], vectors: np.ndarray):
+    """Grava os embeddings da base atual (falhas são ignoradas: o cache é opcional)"""
+    try:
+        os.makedirs(os.path.dirname(embedding_cache_path()) or ".", exist_ok=True)
+        keys = np.frombuffer(b"".join(digests), dtype=np.uint8).reshape(-1, _CHUNK_DIGEST_SIZE)
+        np.savez(embedding_cache_path(), tag=np.array(tag), keys=keys, vectors=vectors)
+    except OSError:
+        pass
+
+def encode_chunks_cached(model: "SentenceTransformer", model_name: str, chunks: list[str],
+                         batch_size: int, config: dict) -> np.ndarray:
+    """Embeddings dos chunks, passando pelo encoder só os que não estão no cache"""
+    tag = embedding_cache_tag(model_name, model)
+    digests = [hashlib.blake2b(chunk.encode("utf-8"), digest_size=_CHUNK_DIGEST_SIZE).digest()
+               for chunk in chunks]
+    rows, cached_vectors = load_embedding_cache(tag)
+    
+    hits = [i for i, digest in enumerate(digests) if digest in rows]
+    if not hits:
+        embeddings_array = encode_corpus(model, chunks, batch_size, config)
+    else:
+        print(f"  ♻️ {len(hits)} de {len(chunks)} embeddings reaproveitados do cache")
+        embeddings_array = np.empty((len(chunks), cached_vectors.shape[1]), dtype=np.float32)
+        embeddings_array[hits] = cached_vectors[[rows[digests[i]] for i in hits]]
+        hit_set = set(hits)
+        misses = [i for i in range(len(chunks)) if i not in hit_set]
+        if misses:
+            embeddings_array[misses] = encode_corpus(model, [chunks[i] for i in misses], batch_size, config)
+    
+    # Só os chunks da base atual: o cache não cresce com versões antigas dos documentos
+    save_embedding_cache(tag, digests, embeddings_array)
+    return embeddings_array
+
 def build_knowledge_base():
     """Constrói a base de conhecimento de forma interativa"""
+    import faiss  # type: ignore
+    
     print(f"\n{Fore.GREEN}🏗️ CONSTRUINDO BASE DE CONHECIMENTO")
     print(f"{Fore.GREEN}{'='*50}")
     
@@ -717,8 +1641,7 @@ def build_knowledge_base():
         
         # Mostrar informações da base atual
         try:
-            with open(config["settings_path"], "r", encoding="utf-8") as f:
-                settings = json.load(f)
+            settings = read_json_file(config["settings_path"])
             print(f"\n{Fore.CYAN}📋 Informações da base atual:")
             print(f"  📄 Total de documentos: {settings.get('total_documents', 'N/A')}")
             print(f"  📝 Total de chunks: {settings.get('total_chunks', 'N/A')}")
@@ -739,15 +1662,24 @@ def build_knowledge_base():
             return
         
         print(f"\n{Fore.YELLOW}🗑️ Removendo base antiga...")
+        # Solta índice/metadados mapeados em memória antes de apagar os arquivos
+        clear_index_cache()
+        # Remove direto (um syscall por arquivo); ausência não é erro
+        def remove_file(path: str) -> bool:
+            try:
+                os.remove(path)
+                return True
+            except FileNotFoundError:
+                return False
+        
         try:
-            if os.path.exists(config["index_path"]):
-                os.remove(config["index_path"])
+            if remove_file(config["index_path"]):
                 print(f"  ✅ Índice removido")
-            if os.path.exists(config["meta_path"]):
-                os.remove(config["meta_path"])
+            if remove_file(config["meta_path"]):
                 print(f"  ✅ Metadados removidos")
-            if os.path.exists(config["settings_path"]):
-                os.remove(config["settings_path"])
+            for sidecar in (meta_offsets_path(config["meta_path"]), *legacy_meta_sidecars(config["meta_path"])):
+                remove_file(sidecar)
+            if remove_file(config["settings_path"]):
                 print(f"  ✅ Configurações removidas")
         except Exception as e:
             print(f"{Fore.RED}❌ Erro ao remover arquivos: {e}")
@@ -791,120 +1723,161 @@ def build_knowledge_base():
         return
     
     try:
+        # O tokenizer do encoder define os limites dos chunks
+        print(f"\n{Fore.BLUE}🧠 Carregando modelo de embeddings...")
+        print(f"  📦 Modelo: {config['embedding_model']}")
+        model = _get_encoder(config["embedding_model"])
+        
+        tokenizer = getattr(model, "tokenizer", None)
+        use_tokens = (config.get("chunk_strategy") == "tokens"
+                      and getattr(tokenizer, "is_fast", False))
+        if use_tokens:
+            # Janela cabe inteira no encoder: desconta os tokens especiais e uma folga
+            # para a retokenização do trecho, que pode variar nas bordas
+            max_tokens = min(config["chunk_max_tokens"], (model.max_seq_length or config["chunk_max_tokens"]) - 4)
+            token_overlap = min(config["chunk_token_overlap"], max_tokens // 2)
+        
         # Criar chunks com estratégia otimizada
         print(f"\n{Fore.BLUE}📝 Dividindo textos em chunks inteligentes...")
+        if use_tokens:
+            print(f"  🔤 Janelas de até {max_tokens} tokens (sobreposição de {token_overlap})")
         chunks: list[str] = []
         metadatas: list[Metadata] = []
         
-        total_content_chars = sum(len(content) for content in documents.values())
-        print(f"  � Processando {total_content_chars:,} caracteres total")
+        print(f"  � Processando {total_chars:,} caracteres total")
+        
+        # Aplica chunking inteligente (offsets calculados junto com os chunks). Os documentos
+        # são independentes: tokens numa única chamada em lote ao tokenizer; caracteres
+        # (Python puro, preso ao GIL) em processos quando há vários documentos
+        contents = list(documents.values())
+        cpus = os.cpu_count() or 1
+        if use_tokens:
+            chunked = chunk_documents_by_tokens(contents, tokenizer, max_tokens, token_overlap)
+        elif len(contents) >= 4 and cpus > 1:
+            with ProcessPoolExecutor(max_workers=min(cpus, len(contents))) as executor:
+                chunked = list(executor.map(chunk_text_with_offsets, contents,
+                                            itertools.repeat(config["chunk_size"]),
+                                            itertools.repeat(config["overlap"])))
+        else:
+            chunked = [chunk_text_with_offsets(content, config["chunk_size"], config["overlap"])
+                       for content in contents]
         
-        for filepath, content in documents.items():
+        for (filepath, content), file_chunks in zip(documents.items(), chunked):
             filename = os.path.basename(filepath)
             print(f"  📝 Processando {filename}...")
             
-            # Aplica chunking inteligente
-            file_chunks = chunk_text(content, config["chunk_size"], config["overlap"])
-            
-            # Filtra chunks muito pequenos (menos úteis para busca)
-            filtered_chunks = [chunk for chunk in file_chunks if len(chunk.strip()) > 50]
-            
-            print(f"    📊 {len(content):,} chars → {len(file_chunks)} chunks → {len(filtered_chunks)} úteis")
+            # Filtra chunks muito pequenos (menos úteis para busca) na mesma passada que monta os metadados
+            useful = 0
+            for chunk, start_char, end_char in file_chunks:
+                if len(chunk) <= 50:
+                    continue
+                chunks.append(chunk)
+                metadatas.append(Metadata(
+                    source=filepath,
+                    basename=filename,
+                    chunk_id=useful,
+                    start_char=start_char,
+                    end_char=end_char
+                ))
+                useful += 1
             
-            start_char = 0
-            for i, chunk in enumerate(filtered_chunks):
-                # Limpa e normaliza o chunk
-                clean_chunk = chunk.strip()
-                if clean_chunk:
-                    chunks.append(clean_chunk)
-                    end_char = start_char + len(chunk)
-                    metadatas.append(Metadata(
-                        source=filepath,
-                        chunk_id=i,
-                        start_char=start_char,
-                        end_char=end_char
-                    ))
-                    start_char = end_char - config["overlap"]
+            print(f"    📊 {len(content):,} chars → {len(file_chunks)} chunks → {useful} úteis")
         
         if not chunks:
             print(f"{Fore.RED}❌ Nenhum chunk válido foi gerado!")
             return
         
+        # Distribuição de tamanhos via reduções do numpy (a mediana por seleção, sem ordenar tudo)
+        sizes = np.fromiter(map(len, chunks), dtype=np.int64, count=len(chunks))
+        mid = len(sizes) // 2
+        
         print(f"{Fore.GREEN}✅ Criados {len(chunks)} chunks úteis")
-        print(f"  📏 Tamanho médio: {sum(len(c) for c in chunks) // len(chunks)} caracteres")
+        print(f"  📏 Tamanho médio: {int(sizes.sum()) // len(chunks)} caracteres")
         print(f"  📊 Distribuição de tamanhos:")
-        
-        # Mostra distribuição de tamanhos para análise
-        sizes = [len(c) for c in chunks]
-        sizes.sort()
-        print(f"    Mínimo: {min(sizes)} chars")
-        print(f"    Mediana: {sizes[len(sizes)//2]} chars")  
-        print(f"    Máximo: {max(sizes)} chars")
+        print(f"    Mínimo: {sizes.min()} chars")
+        print(f"    Mediana: {np.partition(sizes, mid)[mid]} chars")  
+        print(f"    Máximo: {sizes.max()} chars")
         
         # Criar embeddings
-        print(f"\n{Fore.BLUE}🧠 Carregando modelo de embeddings...")
-        print(f"  📦 Modelo: {config['embedding_model']}")
-        model = SentenceTransformer(config["embedding_model"])
+        batch_size = 64
         
-        print(f"{Fore.BLUE}🔄 Gerando embeddings...")
-        embeddings = []
-        batch_size = 32
+        # GPUs com tensor cores (Volta+): FP16 e lotes maiores (só com o backend PyTorch;
+        # ONNX/OpenVINO já executam o grafo otimizado exportado)
+        if encoder_to_fp16(model):
+            batch_size = 256
+            print(f"  🚀 GPU detectada: embeddings em FP16 (lotes de {batch_size})")
         
-        for i in tqdm(range(0, len(chunks), batch_size), desc="Processando chunks"):
-            batch = chunks[i:i+batch_size]
-            batch_embeddings = model.encode(batch, show_progress_bar=False)
-            embeddings.extend(batch_embeddings)
+        print(f"{Fore.BLUE}🔄 Gerando embeddings...")
+        embeddings_array = encode_chunks_cached(model, config["embedding_model"], chunks, batch_size, config)
         
-        embeddings_array = np.array(embeddings).astype('float32')
         print(f"{Fore.GREEN}✅ Embeddings criados: {embeddings_array.shape}")
         
         # Criar índice FAISS
         print(f"\n{Fore.BLUE}🔍 Construindo índice FAISS...")
         dimension = embeddings_array.shape[1]
-        index = faiss.IndexFlatIP(dimension)  # Inner Product (cosine similarity)
         
-        # Normalizar embeddings para cosine similarity
-        faiss.normalize_L2(embeddings_array)
-        index.add(embeddings_array)
+        # Normalizar embeddings para cosine similarity (uma passada vetorizada, em float32).
+        # Modelos que já terminam numa camada Normalize entregam vetores unitários; em FP16
+        # o arredondamento desfaz isso, então só pula a passada com pesos em float32
+        if not (encoder_normalizes(model) and model_dtype_is_fp32(model)):
+            faiss.normalize_L2(embeddings_array)
+        index, index_settings = create_faiss_index(embeddings_array, config)
         
-        print(f"{Fore.GREEN}✅ Índice construído com {index.ntotal} vetores")
+        print(f"{Fore.GREEN}✅ Índice {index_settings['index_type']} construído com {index.ntotal} vetores")
         
         # Criar diretórios de saída
         os.makedirs(os.path.dirname(config["index_path"]), exist_ok=True)
         
-        # Salvar índice
         print(f"\n{Fore.BLUE}💾 Salvando arquivos...")
-        faiss.write_index(index, config["index_path"])
-        print(f"✅ Índice salvo em: {config['index_path']}")
-        
-        # Salvar metadados
-        with open(config["meta_path"], "w", encoding="utf-8") as f:
+        # Índice e metadados são arquivos independentes: o FAISS grava o índice numa thread
+        # (solta o GIL) enquanto esta monta e grava os metadados
+        with ThreadPoolExecutor(max_workers=1) as writer:
+            index_saved = writer.submit(faiss.write_index, index, config["index_path"])
+            
+            # Salvar metadados (com offsets em bytes de cada linha para acesso aleatório)
+            buffer = bytearray()
+            offsets = [0]
             for i, (chunk, meta) in enumerate(zip(chunks, metadatas)):
-                data = {
+                buffer += json_line({
                     "chunk_id": i,
                     "text": chunk,
                     "source": meta.source,
+                    "basename": meta.basename,
                     "start_char": meta.start_char,
                     "end_char": meta.end_char
-                }
-                f.write(json.dumps(data, ensure_ascii=False) + "\n")
+                })
+                offsets.append(len(buffer))
+            with open(config["meta_path"], "wb") as f:
+                f.write(buffer)
+            np.save(meta_offsets_path(config["meta_path"]), np.array(offsets, dtype=np.int64))
+            
+            index_saved.result()
+        print(f"✅ Índice salvo em: {config['index_path']}")
         print(f"✅ Metadados salvos em: {config['meta_path']}")
         
-        # Salvar configurações
+        # Salvar configurações (com a estratégia de chunking efetivamente usada)
+        if use_tokens:
+            chunk_settings = {"chunk_strategy": "tokens", "chunk_max_tokens": max_tokens,
+                              "chunk_token_overlap": token_overlap}
+        else:
+            chunk_settings = {"chunk_strategy": "chars", "chunk_size": config["chunk_size"],
+                              "overlap": config["overlap"]}
         settings = {
             "embedding_model": config["embedding_model"],
-            "chunk_size": config["chunk_size"],
-            "overlap": config["overlap"],
+            **chunk_settings,
             "dimension": dimension,
             "total_chunks": len(chunks),
             "total_documents": len(documents),
-            "created_at": time.strftime("%Y-%m-%d %H:%M:%S")
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            **index_settings
         }
         
-        with open(config["settings_path"], "w", encoding="utf-8") as f:
-            json.dump(settings, f, indent=2, ensure_ascii=False)
+        write_json_file(config["settings_path"], settings)
         print(f"✅ Configurações salvas em: {config['settings_path']}")
         
+        # Invalida índice/metadados em cache para o chat usar a nova base
+        clear_index_cache()
+        
         print(f"\n{Fore.GREEN}🎉 BASE DE CONHECIMENTO CRIADA COM SUCESSO!")
         print(f"{Fore.GREEN}{'='*50}")
         print(f"{Fore.CYAN}📊 Estatísticas:")
@@ -925,48 +1898,371 @@ def build_knowledge_base():
 # Chat Interativo
 # ================================
 
-def load_meta(meta_path: str) -> list[dict[str, Any]]:
-    """Carrega metadados do arquivo JSONL"""
-    items = []
-    with open(meta_path, "r", encoding="utf-8") as f:
-        for line in f:
-            items.append(json.loads(line))
-    return items
+def meta_offsets_path(meta_path: str) -> str:
+    """Caminho da tabela de offsets (bytes) das linhas do JSONL de metadados"""
+    return meta_path + ".offsets.npy"
 
-def search_index(query: str, index_path: str, meta_path: str, top_k: int = 3) -> list[Retrieved]:
-    """Busca no índice FAISS"""
-    config = DEFAULT_CONFIG
-    
-    # Carregar índice e metadados
-    index = faiss.read_index(index_path)
-    meta = load_meta(meta_path)
+def count_meta_records(meta_path: str) -> int:
+    """Nº de chunks nos metadados: pela tabela de offsets quando atual, senão contando linhas"""
+    try:
+        offsets = np.load(meta_offsets_path(meta_path), mmap_mode="r")
+        if len(offsets) and int(offsets[-1]) == os.path.getsize(meta_path):
+            return len(offsets) - 1
+    except (OSError, ValueError):
+        pass  # Base antiga sem tabela (ou ilegível): conta as quebras de linha
+    return count_lines(meta_path)
+
+class MetaStore:
+    """Acesso aleatório ao JSONL de metadados via mmap, sem parsear o arquivo inteiro"""
+    
+    def __init__(self, meta_path: str):
+        with open(meta_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        
+        offsets_path = meta_offsets_path(meta_path)
+        # Mapeada também: abrir a base não copia a tabela inteira para a memória
+        offsets = np.load(offsets_path, mmap_mode="r") if os.path.exists(offsets_path) else None
+        
+        # Sem tabela (base antiga) ou tabela desatualizada: indexa as linhas uma vez
+        if offsets is None or len(offsets) == 0 or int(offsets[-1]) != size:
+            offsets = self._scan_offsets(size)
+        self._offsets = offsets
+    
+    def _scan_offsets(self, size: int) -> np.ndarray:
+        """Calcula o offset de início de cada linha procurando quebras de linha"""
+        offsets = [0]
+        pos = 0
+        while True:
+            nl = self._mm.find(b"\n", pos)
+            if nl < 0:
+                break
+            pos = nl + 1
+            offsets.append(pos)
+        if pos < size:
+            offsets.append(size)  # Última linha sem quebra
+        return np.array(offsets, dtype=np.int64)
+    
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+    
+    def __getitem__(self, i: int) -> dict[str, Any]:
+        i = int(i)
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(f"chunk {i} fora dos metadados ({len(self)} registros)")
+        return json_loads(self._mm[self._offsets[i]:self._offsets[i + 1]])
+    
+    def get_many(self, ids: List[int]) -> list[dict[str, Any]]:
+        """Parseia apenas os registros solicitados"""
+        return [self[i] for i in ids]
+    
+    def close(self):
+        """Libera o mapeamento dos arquivos (JSONL e tabela de offsets)"""
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+        self._mm = b""
+        # O np.memmap só solta o arquivo quando perde a última referência
+        self._offsets = np.zeros(1, dtype=np.int64)
+
+def legacy_meta_sidecars(meta_path: str) -> tuple[str, ...]:
+    """Arquivos de metadados em colunas gravados por versões anteriores (só para limpeza)"""
+    return tuple(meta_path + suffix for suffix in (".cols.npy", ".texts.pkl", ".sources.pkl", ".texts.bin"))
+
+# ================================
+# Cache de Recursos Pesados
+# ================================
+
+@functools.lru_cache(maxsize=4)
+def _get_encoder(model_name: str) -> "SentenceTransformer":
+    """Carrega o modelo de embeddings uma única vez por processo"""
+    configure_cpu_threads()
+    from sentence_transformers import SentenceTransformer
     
-    # Criar embedding da query
-    model = SentenceTransformer(config["embedding_model"])
-    query_embedding = model.encode([query], convert_to_numpy=True, normalize_embeddings=True)
+    backend = DEFAULT_CONFIG.get("embedding_backend", "torch")
+    if backend != "torch":
+        # Grafo exportado roda no ONNX Runtime/OpenVINO (fusões de camadas, sem overhead do eager)
+        try:
+            return SentenceTransformer(model_name, backend=backend, device=embedding_device())
+        except Exception as e:
+            print(f"{Fore.YELLOW}⚠️ Backend '{backend}' indisponível ({e}); usando PyTorch")
+    model = SentenceTransformer(model_name, device=embedding_device())
+    # Busca e construção da base usam a mesma precisão desde a primeira pergunta
+    if not encoder_to_fp16(model):
+        encoder_to_int8(model)
+    return model
+
+def encoder_normalizes(model: "SentenceTransformer") -> bool:
+    """Indica se o pipeline do encoder já termina com normalização L2"""
+    from sentence_transformers.models import Normalize
+    return any(isinstance(module, Normalize) for module in model)
+
+def encoder_to_fp16(model: "SentenceTransformer") -> bool:
+    """Passa o encoder PyTorch para FP16 em GPUs com tensor cores (Volta+); True se ficou em FP16"""
+    import torch
+    param = next(model.parameters(), None)
+    if param is None or param.device.type != "cuda":
+        return False
+    if param.dtype == torch.float32 and torch.cuda.get_device_capability(param.device)[0] >= 7:
+        model.half()
+    return next(model.parameters()).dtype == torch.float16
+
+def encoder_to_int8(model: "SentenceTransformer") -> bool:
+    """Quantiza as camadas lineares do encoder na CPU para INT8 dinâmico, se configurado; True se quantizou"""
+    import torch
+    param = next(model.parameters(), None)
+    if (DEFAULT_CONFIG.get("embedding_quantization") != "int8"
+            or param is None or param.device.type != "cpu"):
+        return False
+    # Pesos em INT8 e ativações quantizadas por lote: GEMMs int8 (VNNI) e metade da memória
+    torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return True
+
+def encoder_is_int8(model: "SentenceTransformer") -> bool:
+    """Indica se o encoder teve as camadas lineares quantizadas (encoder_to_int8)"""
+    import torch
+    return any(isinstance(module, torch.ao.nn.quantized.dynamic.Linear) for module in model.modules())
+
+def model_dtype_is_fp32(model) -> bool:
+    """Pesos do modelo em float32 (não convertidos com .half()); False sem pesos PyTorch (ONNX)"""
+    import torch
+    param = next(model.parameters(), None)
+    return param is not None and param.dtype == torch.float32
+
+def load_settings(settings_path: str) -> dict[str, Any]:
+    """Lê as configurações salvas junto com a base (vazio se não existir)"""
+    try:
+        return read_json_file(settings_path)
+    except (OSError, ValueError):
+        return {}
+
+def describe_chunking(settings: dict[str, Any]) -> str:
+    """Resumo legível da estratégia de chunking (configuração ou settings.json da base)"""
+    if settings.get("chunk_strategy") == "tokens":
+        return (f"janelas de {settings.get('chunk_max_tokens', 'N/A')} tokens, "
+                f"sobreposição de {settings.get('chunk_token_overlap', 'N/A')} tokens")
+    return (f"{settings.get('chunk_size', 'N/A')} caracteres, "
+            f"sobreposição de {settings.get('overlap', 'N/A')} caracteres")
+
+def read_faiss_index(index_path: str):
+    """Lê o índice FAISS mapeado em memória (páginas carregadas sob demanda)"""
+    import faiss  # type: ignore
+    try:
+        return faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+    except RuntimeError:
+        # Tipos de índice sem suporte a mmap nesta versão do FAISS
+        return faiss.read_index(index_path)
+
+@functools.lru_cache(maxsize=1)
+def _gpu_resources():
+    """Recursos de GPU do FAISS (None sem faiss-gpu ou sem GPU); precisam viver junto com o índice"""
+    import faiss  # type: ignore
+    enabled = DEFAULT_CONFIG.get("faiss_gpu") or os.environ.get("RAG_USE_GPU_INDEX") == "1"
+    if not enabled or not hasattr(faiss, "StandardGpuResources"):
+        return None
+    return faiss.StandardGpuResources() if faiss.get_num_gpus() > 0 else None
+
+@functools.lru_cache(maxsize=4)
+def _get_index(index_path: str):
+    """Carrega o índice FAISS uma única vez por processo"""
+    configure_cpu_threads()
+    index = read_faiss_index(index_path)
+    
+    # Parâmetros de busca dependem do tipo de índice gravado na construção
+    settings = load_settings(DEFAULT_CONFIG["settings_path"])
+    if settings.get("index_type") == "hnsw":
+        index.hnsw.efSearch = settings.get("ef_search", DEFAULT_CONFIG["hnsw_ef_search"])
+    else:
+        if settings.get("index_type") == "ivf":
+            # Definido antes da cópia para a GPU, que herda o nprobe
+            index.nprobe = settings["nprobe"]
+        # Busca exaustiva é limitada pela banda de memória: na GPU varre os vetores bem mais rápido
+        res = _gpu_resources()
+        if res is not None:
+            import faiss  # type: ignore
+            # O clonador da GPU só aceita Flat e IVF (não o IndexScalarQuantizer fp16/int8
+            # exaustivo); nos demais casos, ou se a cópia falhar, a busca continua na CPU
+            if isinstance(index, (faiss.IndexFlat, faiss.IndexIVF)):
+                try:
+                    index = faiss.index_cpu_to_gpu(res, 0, index)
+                except RuntimeError as e:
+                    print(f"{Fore.YELLOW}⚠️ Índice mantido na CPU (não foi possível copiá-lo para a GPU: {e})")
+            else:
+                print(f"{Fore.YELLOW}⚠️ Índice {type(index).__name__} não é suportado na GPU; busca na CPU")
+    
+    return index
+
+# Metadados abertos por caminho; dicionário (e não lru_cache) para poder fechá-los ao invalidar
+_meta_stores: dict[str, MetaStore] = {}
+
+def _get_meta(meta_path: str) -> MetaStore:
+    """Abre os metadados uma única vez por processo"""
+    # JSONL é a única cópia dos textos: a busca lê via mmap só as top_k linhas pedidas
+    store = _meta_stores.get(meta_path)
+    if store is None:
+        store = _meta_stores.setdefault(meta_path, MetaStore(meta_path))
+    return store
+
+@functools.lru_cache(maxsize=4)
+def _get_flan(model_name: str, device: str):
+    """Carrega tokenizer e modelo FLAN-T5 uma única vez por processo"""
+    return load_seq2seq_model(model_name, device)
+
+def clear_index_cache():
+    """Descarta índice e metadados em cache (usar após reconstruir a base)"""
+    _get_index.cache_clear()
+    # Fecha os mmaps antes de esquecê-los: a base reconstruída não fica presa aos arquivos
+    # antigos (no Windows, substituir um arquivo mapeado falha)
+    for store in _meta_stores.values():
+        store.close()
+    _meta_stores.clear()
+
+def get_search_resources(index_path: str, meta_path: str) -> tuple:
+    """Retorna (encoder, índice, metadados) prontos para busca"""
+    return (
+        _get_encoder(DEFAULT_CONFIG["embedding_model"]),
+        _get_index(index_path),
+        _get_meta(meta_path),
+    )
+
+def search_index(query: str, index_path: str, meta_path: str, top_k: int = 3,
+                 resources: Optional[tuple] = None) -> list[Retrieved]:
+    """Busca no índice FAISS"""
+    return search_index_batch([query], index_path, meta_path, top_k, resources)[0]
+
+def encode_queries(model: "SentenceTransformer", queries: list[str]) -> np.ndarray:
+    """Embeddings das perguntas chamando os módulos do encoder direto (float32 contíguo)
+    
+    encode() ordena por tamanho, monta lotes e converte saídas a cada chamada; para uma ou
+    poucas perguntas curtas esse overhead em Python pesa mais que o próprio forward.
+    """
+    import torch
+    # tokenize() foi depreciado (imprime aviso no chat) em favor de preprocess()
+    preprocess = getattr(model, "preprocess", None) or model.tokenize
+    features = preprocess(queries)
+    features = {k: v.to(model.device) if isinstance(v, torch.Tensor) else v for k, v in features.items()}
+    with torch.inference_mode():
+        embeddings = model(features)["sentence_embedding"]
+    return np.ascontiguousarray(embeddings.float().cpu().numpy(), dtype=np.float32)
+
+class QueryEmbeddingCache:
+    """LRU de embeddings (já normalizados) das perguntas: repetições não passam pelo encoder"""
+    
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple[int, str], np.ndarray] = OrderedDict()
+        self._lock = threading.Lock()  # search_index pode ser chamado de vários threads
+    
+    def encode(self, model: "SentenceTransformer", queries: list[str]) -> np.ndarray:
+        """Embeddings normalizados das perguntas, calculando só as que faltam no cache"""
+        import faiss  # type: ignore
+        
+        keys = [(id(model), query) for query in queries]
+        with self._lock:
+            cached = [self._entries.get(key) for key in keys]
+            for key, vector in zip(keys, cached):
+                if vector is not None:
+                    self._entries.move_to_end(key)
+        
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        if not missing:
+            return np.stack(cached)
+        
+        fresh = encode_queries(model, [queries[i] for i in missing])
+        faiss.normalize_L2(fresh)
+        if len(missing) == len(queries):
+            embeddings = fresh
+        else:
+            embeddings = np.empty((len(queries), fresh.shape[1]), dtype=np.float32)
+            embeddings[missing] = fresh
+            for i, vector in enumerate(cached):
+                if vector is not None:
+                    embeddings[i] = vector
+        
+        if self.max_entries > 0:
+            with self._lock:
+                for i, vector in zip(missing, fresh):
+                    self._entries[keys[i]] = vector
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return embeddings
+
+_query_embeddings = QueryEmbeddingCache(DEFAULT_CONFIG["query_cache_size"])
+
+def search_index_batch(queries: list[str], index_path: str, meta_path: str, top_k: int = 3,
+                       resources: Optional[tuple] = None) -> list[list[Retrieved]]:
+    """Busca várias perguntas de uma vez: um encode e um index.search para o lote todo"""
+    # Reutiliza encoder, índice e metadados já carregados
+    model, index, meta = resources or get_search_resources(index_path, meta_path)
+    
+    # Criar embeddings das queries (perguntas repetidas vêm do cache)
+    query_embeddings = _query_embeddings.encode(model, queries)
     
     # Buscar
-    scores, indices = index.search(query_embedding, top_k)
-    indices = indices[0]
-    scores = scores[0]
-    
-    # Montar resultados
-    results: list[Retrieved] = []
-    for i, score in zip(indices, scores):
-        if i == -1:
-            continue
-        rec = meta[i]
-        metadata = Metadata(
-            source=rec["source"],
-            chunk_id=rec["chunk_id"],
-            start_char=rec["start_char"],
-            end_char=rec["end_char"]
-        )
-        results.append(Retrieved(text=rec["text"], meta=metadata, score=float(score)))
+    all_scores, all_indices = index.search(query_embeddings, top_k)
+    
+    batch_results: list[list[Retrieved]] = []
+    for indices, scores in zip(all_indices, all_scores):
+        # FAISS completa com -1 quando há menos de top_k vetores
+        valid = indices >= 0
+        records = meta.get_many(indices[valid].tolist())
+        
+        # Montar resultados
+        results: list[Retrieved] = []
+        for rec, score in zip(records, scores[valid].tolist()):
+            metadata = Metadata(
+                source=rec["source"],
+                chunk_id=rec["chunk_id"],
+                start_char=rec["start_char"],
+                end_char=rec["end_char"],
+                # Índices antigos não gravavam o basename
+                basename=rec.get("basename") or os.path.basename(rec["source"])
+            )
+            results.append(Retrieved(text=rec["text"], meta=metadata, score=score))
+        batch_results.append(results)
     
-    return results
+    return batch_results
 
-def generate_answer(contexts: list[Retrieved], question: str) -> str:
+RAG_PROMPT_HEADER = """Você é um assistente especializado da ICTA Technology. Responda APENAS com base no contexto fornecido abaixo.
+
+IMPORTANTE: 
+- Use SOMENTE as informações do contexto
+- Se a resposta não estiver clara no contexto, diga que precisa de mais informações
+- Seja específico e direto
+- Mantenha o foco em BI, automação, IA e integrações
+
+CONTEXTO DA ICTA:
+"""
+
+def fit_to_token_budget(tokenizer, texts: list[str], budget: int) -> list[str]:
+    """Textos, na ordem dada (mais relevantes primeiro), que cabem em `budget` tokens
+    
+    Se nem o primeiro couber sozinho, ele entra cortado no limite.
+    """
+    if not texts or budget <= 0:
+        return []
+    lengths = tokenizer(texts, add_special_tokens=False, return_length=True)["length"]
+    kept: list[str] = []
+    used = 0
+    for text, length in zip(texts, lengths):
+        if used + length > budget:
+            break
+        kept.append(text)
+        used += length
+    if not kept:
+        ids = tokenizer(texts[0], add_special_tokens=False, truncation=True, max_length=budget)["input_ids"]
+        kept.append(tokenizer.decode(ids, skip_special_tokens=True))
+    return kept
+
+def score_stats(contexts: list[Retrieved]) -> tuple[float, float]:
+    """(score médio, score mínimo) dos contextos recuperados"""
+    # Reduções vetorizadas sobre um array contíguo (o top_k pode chegar a dezenas)
+    scores = np.fromiter((ctx.score for ctx in contexts), dtype=np.float32, count=len(contexts))
+    return float(scores.mean()), float(scores.min())
+
+def generate_answer(contexts: list[Retrieved], question: str,
+                    stats: Optional[tuple[float, float]] = None) -> str:
     """Gera resposta usando RAG + FLAN-T5 híbrido"""
     config = DEFAULT_CONFIG
     
@@ -975,94 +2271,112 @@ def generate_answer(contexts: list[Retrieved], question: str) -> str:
         print(f"{Fore.YELLOW}🔍 Nenhum contexto encontrado no RAG, usando FLAN-T5...")
         return flan_fallback.generate_fallback_response(question)
     
-    # Calcular score médio para decidir usar RAG ou FLAN-T5
-    avg_score = sum(ctx.score for ctx in contexts) / len(contexts)
-    min_score = min(ctx.score for ctx in contexts)
+    # Score médio/mínimo para decidir usar RAG ou FLAN-T5 (reaproveita os do chamador)
+    avg_score, min_score = stats or score_stats(contexts)
     
     # Limiar para decidir entre RAG e FLAN-T5
-    RAG_THRESHOLD = 0.4
     MIN_SCORE_THRESHOLD = 0.3
     
-    if avg_score < RAG_THRESHOLD or min_score < MIN_SCORE_THRESHOLD:
+    if avg_score < RAG_SCORE_THRESHOLD or min_score < MIN_SCORE_THRESHOLD:
         print(f"{Fore.YELLOW}🤔 Contexto RAG com baixa relevância (score: {avg_score:.2f}), usando FLAN-T5...")
         return flan_fallback.generate_fallback_response(question)
     
     # Usar RAG com contexto de alta qualidade
     print(f"{Fore.GREEN}✅ Usando RAG com contexto relevante (score: {avg_score:.2f})")
-    
-    # Montar prompt para RAG
-    context_text = "\n\n".join([
-        f"[DOCUMENTO {i+1} - Relevância: {ctx.score:.2f}]\n{ctx.text}" 
-        for i, ctx in enumerate(contexts)
-    ])
-    
-    prompt = f"""Você é um assistente especializado da ICTA Technology. Responda APENAS com base no contexto fornecido abaixo.
-
-IMPORTANTE: 
-- Use SOMENTE as informações do contexto
-- Se a resposta não estiver clara no contexto, diga que precisa de mais informações
-- Seja específico e direto
-- Mantenha o foco em BI, automação, IA e integrações
-
-CONTEXTO DA ICTA:
-{context_text}
-
-PERGUNTA DO CLIENTE: {question}
-
-RESPOSTA BASEADA NO CONTEXTO:"""
+    footnote = f"\n\n📊 *Resposta baseada na base de conhecimento da ICTA (relevância: {avg_score:.1%})*"
+    
+    # Mesma pergunta (ou parecida) com os mesmos documentos: reaproveita a geração
+    cache_context = "\x1f".join(ctx.text for ctx in contexts)
+    # Guloso: resposta presa ao contexto dispensa amostragem; repetition_penalty no lugar do
+    # no_repeat_ngram_size (que varre os n-gramas já gerados a cada passo)
+    params = dict(
+        input_max_length=config["prompt_max_tokens"],
+        max_new_tokens=min(config["max_tokens"], config["answer_max_new_tokens"]),
+        do_sample=False,
+        num_beams=1,
+        repetition_penalty=1.1
+    )
+    generation = generation_signature(config["generation_model"], params)
+    cached = rag_answer_cache.get(question, cache_context, generation)
+    if cached is not None:
+        return cached + footnote
     
     # Carregar modelo se necessário
     try:
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        tokenizer = AutoTokenizer.from_pretrained(config["generation_model"])
-        model = AutoModelForSeq2SeqLM.from_pretrained(config["generation_model"]).to(device)
+        device = default_device()
+        tokenizer, model = _get_flan(config["generation_model"], device)
+        
+        # Montar prompt para RAG (fragmentos concatenados de uma vez só); documentos entram
+        # por relevância enquanto couberem, para a pergunta no final nunca ser truncada
+        question_part = f"PERGUNTA DO CLIENTE: {question}\n\nRESPOSTA BASEADA NO CONTEXTO:"
+        fixed_tokens = len(tokenizer(RAG_PROMPT_HEADER + question_part)["input_ids"])
+        documents = fit_to_token_budget(tokenizer, [
+            f"[DOCUMENTO {i+1} - Relevância: {ctx.score:.2f} - Fonte: {ctx.meta.basename}]\n{ctx.text}\n\n"
+            for i, ctx in enumerate(contexts)
+        ], config["prompt_max_tokens"] - fixed_tokens)
+        prompt = "".join([RAG_PROMPT_HEADER, *documents, question_part])
         
         # Gerar resposta
-        inputs = tokenizer(prompt, return_tensors="pt", truncation=True, max_length=10000).to(device)
-        
-        with torch.no_grad():
-            outputs = model.generate(
-                **inputs,
-                max_new_tokens=config["max_tokens"],
-                do_sample=True,
-                temperature=0.3,
-                top_p=0.9,
-                pad_token_id=tokenizer.eos_token_id,
-                no_repeat_ngram_size=2
-            )
-        
-        response = tokenizer.decode(outputs[0], skip_special_tokens=True)
+        # Geração via executor em lotes (compartilha o FLAN-T5 e agrupa pedidos simultâneos)
+        response = get_flan_runner(config["generation_model"], device).submit(
+            prompt, pad_token_id=tokenizer.eos_token_id, **params
+        )
         
         # Limpar resposta
         response = response.replace(prompt, "").strip()
+        rag_answer_cache.put(question, cache_context, response, generation)
         
         # Adicionar indicador de que foi resposta do RAG
-        response += f"\n\n📊 *Resposta baseada na base de conhecimento da ICTA (relevância: {avg_score:.1%})*"
-        
-        return response
+        return response + footnote
         
     except Exception as e:
         print(f"{Fore.RED}❌ Erro no RAG, usando FLAN-T5 como backup: {e}")
         return flan_fallback.generate_fallback_response(question)
 
-def hybrid_rag_query(query: str, top_k: int = 8) -> tuple[str, str]:
+# Limiar de score médio para responder com o contexto do RAG
+RAG_SCORE_THRESHOLD = 0.4
+
+class RagPipeline:
+    """Uma busca por pergunta: embedding, FAISS e scores calculados uma única vez"""
+    
+    def __init__(self, index_path: str = "./index/faiss.index", meta_path: str = "./index/meta.jsonl",
+                 top_k: int = 8, resources: Optional[tuple] = None):
+        self.index_path = index_path
+        self.meta_path = meta_path
+        self.top_k = top_k
+        self.resources = resources
+    
+    def retrieve(self, query: str) -> tuple[list[Retrieved], Optional[tuple[float, float]]]:
+        """Resultados da busca e (score médio, mínimo); None quando não há resultados"""
+        results = search_index(query, self.index_path, self.meta_path, top_k=self.top_k,
+                               resources=self.resources)
+        return results, (score_stats(results) if results else None)
+    
+    def answer(self, query: str) -> tuple[str, str]:
+        """Responde com o modelo português, com ou sem contexto RAG; retorna (resposta, fonte)"""
+        results, stats = self.retrieve(query)
+        if stats is None:
+            return generate_enhanced_answer_without_context(query), "no_rag"
+        if stats[0] >= RAG_SCORE_THRESHOLD:
+            return generate_enhanced_answer_with_context(results, query), "rag"
+        return generate_enhanced_answer_without_context(query), "low_rag"
+
+def hybrid_rag_query(query: str, top_k: int = 8, pipeline: Optional[RagPipeline] = None) -> tuple[str, str]:
     """Consulta híbrida que combina RAG e FLAN-T5"""
+    pipeline = pipeline or RagPipeline(top_k=top_k)
     
     # 1. Tentar buscar no RAG primeiro
     try:
-        search_results = search_index(query, "./index/faiss.index", "./index/meta.jsonl", top_k=top_k)
+        search_results, stats = pipeline.retrieve(query)
         
-        if search_results:
-            # Analisar qualidade dos resultados
-            scores = [result.score for result in search_results]
-            avg_score = sum(scores) / len(scores)
-            
+        if stats is not None:
+            avg_score = stats[0]
             print(f"{Fore.CYAN}🔍 RAG encontrou {len(search_results)} resultados (score médio: {avg_score:.2f})")
             
-            # Gerar resposta (decide internamente entre RAG e FLAN-T5)
-            answer = generate_answer(search_results, query)
+            # Gerar resposta (decide internamente entre RAG e FLAN-T5, com os mesmos scores)
+            answer = generate_answer(search_results, query, stats)
             
-            if avg_score >= 0.4:
+            if avg_score >= RAG_SCORE_THRESHOLD:
                 return answer, "rag"
             else:
                 return answer, "flan_t5_low_rag"
@@ -1077,107 +2391,137 @@ def hybrid_rag_query(query: str, top_k: int = 8) -> tuple[str, str]:
         answer = flan_fallback.generate_fallback_response(query)
         return answer, "flan_t5_error"
 
+# Códigos de cor resolvidos uma vez (print_colored roda várias vezes por turno)
+_COLORS = {
+    "red": Fore.RED,
+    "green": Fore.GREEN,
+    "blue": Fore.BLUE,
+    "yellow": Fore.YELLOW,
+    "cyan": Fore.CYAN,
+    "magenta": Fore.MAGENTA,
+    "white": Fore.WHITE,
+    "gray": Fore.LIGHTBLACK_EX
+}
+_RESET_LINE = Style.RESET_ALL + "\n"
+
 def print_colored(text: str, color: str = "white"):
     """Imprime texto com cor específica"""
-    colors = {
-        "red": Fore.RED,
-        "green": Fore.GREEN,
-        "blue": Fore.BLUE,
-        "yellow": Fore.YELLOW,
-        "cyan": Fore.CYAN,
-        "magenta": Fore.MAGENTA,
-        "white": Fore.WHITE,
-        "gray": Fore.LIGHTBLACK_EX
-    }
-    print(f"{colors.get(color, Fore.WHITE)}{text}{Style.RESET_ALL}")
+    # Uma única escrita com a quebra de linha (print faz duas); sem terminal o colorama
+    # já remove os códigos ANSI
+    sys.stdout.write(_COLORS.get(color, Fore.WHITE) + text + _RESET_LINE)
 
 def clear_screen():
     """Limpa a tela do terminal"""
     os.system('cls' if os.name == 'nt' else 'clear')
 
+# Intenções por palavras-chave (ordem = prioridade): intenção -> (tópico, palavras)
+_INTENTS = {
+    "saudacao": ("saudação", ['olá', 'oi', 'bom dia', 'boa tarde', 'boa noite', 'hello', 'hey']),
+    "despedida": ("despedida", ['tchau', 'até logo', 'bye', 'adeus', 'obrigado', 'valeu']),
+    "integracao": ("integrações com TOTVS", ['totvs', 'integração', 'integrar', 'conectar', 'sistema', 'erp']),
+    "bi": ("Business Intelligence", ['bi', 'business intelligence', 'relatório', 'dashboard', 'kpi']),
+    "automacao": ("automação de processos", ['automação', 'automatizar', 'processo', 'workflow']),
+    "ia": ("inteligência artificial", ['ia', 'inteligência artificial', 'machine learning', 'ai']),
+    "servicos": ("serviços da ICTA", ['serviço', 'oferecem', 'fazem', 'trabalham', 'consultoria']),
+}
+
+_INTENT_MATCHER = keyword_matcher({intent: words for intent, (_, words) in _INTENTS.items()})
+
 def classify_query_intent(question: str) -> dict:
     """Classifica a intenção da pergunta usando palavras-chave simples"""
     try:
-        question_lower = question.lower()
-        
-        # Classificação baseada em palavras-chave
-        if any(word in question_lower for word in ['olá', 'oi', 'bom dia', 'boa tarde', 'boa noite', 'hello', 'hey']):
-            return {"intent": "saudacao", "topic": "saudação", "confidence": "high"}
-        
-        elif any(word in question_lower for word in ['tchau', 'até logo', 'bye', 'adeus', 'obrigado', 'valeu']):
-            return {"intent": "despedida", "topic": "despedida", "confidence": "high"}
-        
-        elif any(word in question_lower for word in ['totvs', 'integração', 'integrar', 'conectar', 'sistema', 'erp']):
-            return {"intent": "integracao", "topic": "integrações com TOTVS", "confidence": "high"}
-        
-        elif any(word in question_lower for word in ['bi', 'business intelligence', 'relatório', 'dashboard', 'kpi']):
-            return {"intent": "bi", "topic": "Business Intelligence", "confidence": "high"}
-        
-        elif any(word in question_lower for word in ['automação', 'automatizar', 'processo', 'workflow']):
-            return {"intent": "automacao", "topic": "automação de processos", "confidence": "high"}
-        
-        elif any(word in question_lower for word in ['ia', 'inteligência artificial', 'machine learning', 'ai']):
-            return {"intent": "ia", "topic": "inteligência artificial", "confidence": "high"}
-        
-        elif any(word in question_lower for word in ['serviço', 'oferecem', 'fazem', 'trabalham', 'consultoria']):
-            return {"intent": "servicos", "topic": "serviços da ICTA", "confidence": "high"}
-        
-        else:
-            return {"intent": "geral", "topic": "informações gerais", "confidence": "medium"}
+        # Uma única varredura encontra todas as intenções presentes; vale a de maior prioridade
+        found = _INTENT_MATCHER(question.lower())
+        for intent, (topic, _) in _INTENTS.items():
+            if intent in found:
+                return {"intent": intent, "topic": topic, "confidence": "high"}
+        return {"intent": "geral", "topic": "informações gerais", "confidence": "medium"}
             
     except Exception as e:
         print_colored(f"❌ Erro na classificação: {e}", "red")
         return {"intent": "geral", "topic": "informações gerais", "confidence": "low"}
 
+# Respostas prontas para mensagens que são só cumprimento ou despedida
+SMALL_TALK_REPLIES = {
+    "saudacao": "Olá! 👋 Sou o assistente da ICTA Technology. Como posso ajudar você hoje? Posso esclarecer dúvidas sobre nossos serviços de BI, automação e IA!",
+    "despedida": "Até logo! 👋 Foi um prazer ajudar. Se precisar de mais alguma coisa sobre BI, automação ou IA, estarei aqui!",
+}
+
+# Só estas palavras/expressões caracterizam cumprimento ou despedida; as de _SMALL_TALK_FILLER
+# apenas acompanham (sozinhas, "tudo bem" ou "muito bom" não bastam)
+_GREETING_WORDS = frozenset({'olá', 'ola', 'oi', 'hello', 'hey'})
+_GREETING_PHRASES = frozenset({('bom', 'dia'), ('boa', 'tarde'), ('boa', 'noite'), ('e', 'aí'), ('e', 'ai')})
+_FAREWELL_WORDS = frozenset({'tchau', 'bye', 'adeus', 'obrigado', 'obrigada', 'valeu'})
+_FAREWELL_PHRASES = frozenset({('até', 'logo'), ('até', 'mais')})
+_SMALL_TALK_FILLER = frozenset({'bom', 'boa', 'dia', 'tarde', 'noite', 'tudo', 'bem', 'e', 'aí', 'ai',
+                                'pessoal', 'até', 'logo', 'mais', 'muito'})
+
+def small_talk_reply(question: str) -> Optional[str]:
+    """Resposta pronta quando a mensagem inteira é cumprimento/despedida (None caso contrário)"""
+    words = re.findall(r"\w+", question.lower())
+    if not words or len(words) > 6:
+        return None
+    # Palavra por palavra: "oi" em "depois" ou "boa" numa pergunta real não disparam a resposta pronta
+    if not all(word in _GREETING_WORDS or word in _FAREWELL_WORDS or word in _SMALL_TALK_FILLER
+               for word in words):
+        return None
+    pairs = set(zip(words, words[1:]))
+    if any(word in _FAREWELL_WORDS for word in words) or pairs & _FAREWELL_PHRASES:
+        return SMALL_TALK_REPLIES["despedida"]
+    if any(word in _GREETING_WORDS for word in words) or pairs & _GREETING_PHRASES:
+        return SMALL_TALK_REPLIES["saudacao"]
+    return None
+
+# Prompts da resposta guiada, montados uma vez na carga do módulo
+GUIDED_PROMPT_GENERAL = """Você é um assistente da ICTA Technology. Responda de forma conversacional e útil.
+
+Pergunta: {question}
+Tópico: {topic}
+
+Responda de forma amigável, faça perguntas se necessário, e sugira como podemos ajudar.
+
+Resposta:"""
+
+GUIDED_PROMPT_CONTEXT = """Baseado no contexto, responda a pergunta de forma conversacional e útil.
+
+Contexto: {context}
+Pergunta: {question}
+
+Resposta conversacional:"""
+
 def generate_guided_response(contexts: list, question: str, intent_info: dict) -> str:
     """Gera resposta guiada com interação usando FLAN-T5"""
     try:
         config = DEFAULT_CONFIG
         model_name = config["generation_model"]
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        tokenizer = AutoTokenizer.from_pretrained(model_name)
-        model = AutoModelForSeq2SeqLM.from_pretrained(model_name).to(device)
+        device = default_device()
+        tokenizer, model = _get_flan(model_name, device)
         
         # Verifica se há contextos relevantes
         if not contexts or all(ctx.score < 0.3 for ctx in contexts):
             # Sem contextos relevantes - resposta conversacional simples
-            if intent_info.get('intent') == 'saudacao':
-                return "Olá! 👋 Sou o assistente da ICTA Technology. Como posso ajudar você hoje? Posso esclarecer dúvidas sobre nossos serviços de BI, automação e IA!"
-            elif intent_info.get('intent') == 'despedida':
-                return "Até logo! 👋 Foi um prazer ajudar. Se precisar de mais alguma coisa sobre BI, automação ou IA, estarei aqui!"
+            if intent_info.get('intent') in SMALL_TALK_REPLIES:
+                return SMALL_TALK_REPLIES[intent_info['intent']]
             else:
-                guidance_prompt = f"""Você é um assistente da ICTA Technology. Responda de forma conversacional e útil.
-
-Pergunta: {question}
-Tópico: {intent_info.get('topic', 'geral')}
-
-Responda de forma amigável, faça perguntas se necessário, e sugira como podemos ajudar.
-
-Resposta:"""
+                guidance_prompt = GUIDED_PROMPT_GENERAL.format(
+                    question=question, topic=intent_info.get('topic', 'geral')
+                )
         else:
             # Com contextos - resposta com base no conteúdo
             context_text = "\n".join([f"- {ctx.text[:200]}..." for ctx in contexts[:2]])
             
-            guidance_prompt = f"""Baseado no contexto, responda a pergunta de forma conversacional e útil.
-
-Contexto: {context_text}
-Pergunta: {question}
-
-Resposta conversacional:"""
-        
-        inputs = tokenizer(guidance_prompt, return_tensors="pt", max_length=10000, truncation=True).to(device)
-        
-        with torch.no_grad():
-            outputs = model.generate(
-                **inputs,
-                max_length=400,
-                temperature=0.5,
-                do_sample=True,
-                repetition_penalty=1.1,
-                pad_token_id=tokenizer.eos_token_id
-            )
-        
-        response = tokenizer.decode(outputs[0], skip_special_tokens=True).strip()
+            guidance_prompt = GUIDED_PROMPT_CONTEXT.format(context=context_text, question=question)
+        
+        # Geração via executor em lotes (compartilha o FLAN-T5 e agrupa pedidos simultâneos)
+        response = get_flan_runner(config["generation_model"], device).submit(
+            guidance_prompt,
+            input_max_length=config["prompt_max_tokens"],
+            max_new_tokens=config["answer_max_new_tokens"],
+            do_sample=False,  # Guloso: sem amostragem por passo
+            num_beams=1,
+            repetition_penalty=1.1,
+            pad_token_id=tokenizer.eos_token_id
+        ).strip()
         
         # Limpar a resposta removendo o prompt
         if "Resposta:" in response:
@@ -1243,11 +2587,21 @@ def interactive_chat():
     if not rag_available:
         print_colored("⚠️ Para melhor experiência, construa a base de conhecimento primeiro (opção 1)", "yellow")
     
+    # Carregar encoder, índice e metadados uma única vez para toda a conversa
+    pipeline = None
+    if rag_available:
+        try:
+            pipeline = RagPipeline(resources=get_search_resources("./index/faiss.index", "./index/meta.jsonl"))
+        except Exception as e:
+            print_colored(f"⚠️ Não foi possível carregar a base de conhecimento: {e}", "yellow")
+            rag_available = False
+    
     print_colored("\n🤖 Olá! Sou o assistente da ICTA Technology.", "green")
     print_colored("💡 Posso ajudar com dúvidas sobre BI, automação, IA e integrações.", "blue")
     print_colored("\n📝 Digite sua pergunta (ou 'sair' para encerrar):", "white")
     
-    conversation_history = []
+    # Cada mensagem vira uma linha JSONL gravada em segundo plano
+    history = HistoryWriter(os.path.dirname(DEFAULT_CONFIG["history_path"]))
     
     while True:
         print_colored("\n" + "─" * 50, "gray")
@@ -1262,29 +2616,17 @@ def interactive_chat():
             continue
         
         # Salvar pergunta do usuário
-        conversation_history.append({"role": "user", "content": user_input, "timestamp": datetime.now().isoformat()})
+        history.append({"role": "user", "content": user_input, "timestamp": datetime.now().isoformat()})
         
         # Processar pergunta silenciosamente (sem mostrar detalhes técnicos)
         try:
-            if rag_available:
-                # Tentar RAG primeiro
-                search_results = search_index(user_input, "./index/faiss.index", "./index/meta.jsonl", top_k=8)
-                
-                if search_results:
-                    # Avaliar qualidade silenciosamente
-                    scores = [result.score for result in search_results]
-                    avg_score = sum(scores) / len(scores)
-                    
-                    # Usar RAG + FLAN-T5 se qualidade é boa
-                    if avg_score >= 0.4:
-                        # RAG context + FLAN-T5 processing
-                        answer = generate_enhanced_answer_with_context(search_results, user_input)
-                    else:
-                        # Apenas FLAN-T5 sem contexto RAG
-                        answer = generate_enhanced_answer_without_context(user_input)
-                else:
-                    # Sem resultados RAG, usar apenas FLAN-T5
-                    answer = generate_enhanced_answer_without_context(user_input)
+            canned = small_talk_reply(user_input)
+            if canned is not None:
+                # Saudação/despedida curta: resposta pronta, sem busca nem geração
+                answer = canned
+            elif rag_available:
+                # RAG primeiro: uma busca decide entre contexto e modelo português puro
+                answer, _ = pipeline.answer(user_input)
             else:
                 # Apenas FLAN-T5 sem RAG
                 answer = generate_enhanced_answer_without_context(user_input)
@@ -1298,14 +2640,14 @@ def interactive_chat():
         print_colored(answer, "white")
         
         # Salvar resposta
-        conversation_history.append({
+        history.append({
             "role": "assistant", 
             "content": answer,
             "timestamp": datetime.now().isoformat()
         })
     
-    # Salvar histórico silenciosamente
-    save_conversation_history(conversation_history)
+    # Esperar as gravações pendentes do histórico
+    history.close()
     wait_for_enter()
 
 def generate_enhanced_answer_with_context(contexts: list[Retrieved], question: str) -> str:
@@ -1314,15 +2656,12 @@ def generate_enhanced_answer_with_context(contexts: list[Retrieved], question: s
         if not contexts:
             return generate_enhanced_answer_without_context(question)
         
-        # Extrair contexto dos melhores resultados
-        context_parts = []
-        for ctx in contexts[:5]:  # Usar os 5 melhores
-            context_parts.append(ctx.text.strip())
-        
-        rag_context = "\n\n".join(context_parts)
+        # Extrair contexto dos 5 melhores resultados (um único join)
+        rag_context = "\n\n".join([ctx.text.strip() for ctx in contexts[:5]])
         
         # Usar modelo português para resposta melhor
-        response = portuguese_llm.generate_enhanced_response(question, rag_context)
+        response = portuguese_llm.generate_enhanced_response(question, rag_context, contexts[0].score,
+                                                             contexts[0].text)
         
         return response
         
@@ -1349,103 +2688,44 @@ def generate_enhanced_answer_without_context(question: str) -> str:
         
     except Exception:
         return "Posso ajudar com informações sobre os serviços da ICTA Technology. O que gostaria de saber?"
-    
-    conversation_history = []
-    response_stats = {"rag": 0, "flan_t5_low_rag": 0, "flan_t5_no_rag": 0, "flan_t5_error": 0}
-    
-    while True:
-        print_colored("\n" + "─" * 50, "gray")
-        user_input = input(f"{Fore.YELLOW}👤 Você: {Style.RESET_ALL}").strip()
-        
-        if user_input.lower() in ['sair', 'exit', 'quit', 'bye']:
-            print_colored("\n� ESTATÍSTICAS DA CONVERSA:", "cyan")
-            print_colored(f"   🎯 Respostas RAG: {response_stats['rag']}", "green")
-            print_colored(f"   🤖 Respostas FLAN-T5 (baixa relevância): {response_stats['flan_t5_low_rag']}", "yellow")
-            print_colored(f"   🧠 Respostas FLAN-T5 (sem contexto): {response_stats['flan_t5_no_rag']}", "blue")
-            print_colored(f"   🔧 Fallback por erro: {response_stats['flan_t5_error']}", "red")
-            print_colored("\n�👋 Obrigado por usar o assistente híbrido ICTA! Até logo!", "green")
-            break
-        
-        if not user_input:
-            print_colored("❓ Por favor, digite uma pergunta.", "yellow")
-            continue
-        
-        # Salvar pergunta do usuário
-        conversation_history.append({"role": "user", "content": user_input, "timestamp": datetime.now().isoformat()})
-        
-        print_colored(f"{Fore.CYAN}🔍 Processando pergunta...", "cyan")
-        
-        # Usar sistema híbrido
-        if rag_available:
-            try:
-                answer, source_type = hybrid_rag_query(user_input, top_k=8)
-                response_stats[source_type] += 1
-                
-                # Indicador visual do tipo de resposta
-                if source_type == "rag":
-                    indicator = "🎯 RAG"
-                elif source_type == "flan_t5_low_rag":
-                    indicator = "🤖 FLAN-T5 (baixa relevância RAG)"
-                elif source_type == "flan_t5_no_rag":
-                    indicator = "🧠 FLAN-T5 (sem contexto RAG)"
-                else:
-                    indicator = "🔧 FLAN-T5 (fallback)"
-                
-                print_colored(f"   Fonte: {indicator}", "gray")
-                
-            except Exception as e:
-                print_colored(f"❌ Erro no sistema híbrido: {e}", "red")
-                answer = flan_fallback.generate_fallback_response(user_input)
-                response_stats["flan_t5_error"] += 1
-        else:
-            # Apenas FLAN-T5 se não há RAG
-            print_colored("   🧠 Usando apenas FLAN-T5 (sem RAG)", "yellow")
-            answer = flan_fallback.generate_fallback_response(user_input)
-            response_stats["flan_t5_no_rag"] += 1
-        
-        # Exibir resposta
-        print_colored(f"\n🤖 ICTA Assistant:", "cyan")
-        print_colored(answer, "white")
-        
-        # Perguntar feedback para melhoria contínua
-        print_colored(f"\n💭 Esta resposta foi útil? (s/n/parcial): ", "gray", end="")
-        try:
-            feedback = input().strip().lower()
-            if feedback in ['n', 'não', 'nao']:
-                print_colored("� Vou tentar uma abordagem diferente na próxima!", "blue")
-            elif feedback in ['parcial', 'mais ou menos']:
-                print_colored("📝 Entendi, vou me esforçar para ser mais preciso!", "yellow")
-            elif feedback in ['s', 'sim', 'yes']:
-                print_colored("😊 Fico feliz em ajudar!", "green")
-        except KeyboardInterrupt:
-            break
-        
-        # Salvar resposta com metadados
-        conversation_history.append({
-            "role": "assistant", 
-            "content": answer,
-            "source_type": source_type if rag_available else "flan_t5_only",
-            "feedback": feedback if 'feedback' in locals() else None,
-            "timestamp": datetime.now().isoformat()
-        })
-    
-    # Salvar histórico
-    save_conversation_history(conversation_history)
-    wait_for_enter()
 
-def save_conversation_history(history: list):
-    """Salva o histórico da conversa"""
-    try:
-        os.makedirs("./history", exist_ok=True)
+class HistoryWriter:
+    """Histórico da conversa em JSONL: uma linha por mensagem, gravada por uma thread de I/O"""
+    
+    def __init__(self, directory: str = "./history"):
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        history_file = f"./history/chat_{timestamp}.json"
-        
-        with open(history_file, 'w', encoding='utf-8') as f:
-            json.dump(history, f, ensure_ascii=False, indent=2)
-        
-        print_colored(f"💾 Conversa salva em: {history_file}", "green")
-    except Exception as e:
-        print_colored(f"❌ Erro ao salvar histórico: {e}", "red")
+        self.directory = directory
+        self.path = os.path.join(directory, f"chat_{timestamp}.jsonl")
+        self._file = None
+        self._error: Optional[Exception] = None
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history")
+    
+    def append(self, message: dict):
+        """Enfileira a mensagem; o chat não espera a escrita em disco"""
+        self._pool.submit(self._write, message)
+    
+    def _write(self, message: dict):
+        """Acrescenta uma linha ao arquivo (aberto na primeira mensagem)"""
+        if self._error is not None:
+            return
+        try:
+            if self._file is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self._file = open(self.path, "ab")
+            self._file.write(json_line(message))
+            self._file.flush()
+        except OSError as e:
+            self._error = e
+    
+    def close(self):
+        """Aguarda as gravações pendentes, fecha o arquivo e informa o resultado"""
+        self._pool.shutdown(wait=True)
+        if self._file is not None:
+            self._file.close()
+        if self._error is not None:
+            print_colored(f"❌ Erro ao salvar histórico: {self._error}", "red")
+        elif self._file is not None:
+            print_colored(f"💾 Conversa salva em: {self.path}", "green")
 
 def start_chat():
     """Inicia o chat interativo inteligente"""
@@ -1465,11 +2745,16 @@ def show_settings():
     print(f"\n{Fore.CYAN}📋 Configurações atuais:")
     print(f"  1. Modelo de embeddings: {config['embedding_model']}")
     print(f"  2. Modelo de geração: {config['generation_model']}")
-    print(f"  3. Tamanho do chunk: {config['chunk_size']} caracteres")
-    print(f"  4. Sobreposição: {config['overlap']} caracteres")
+    print(f"  3. Estratégia de chunking: {config['chunk_strategy']}")
+    print(f"  4. Tamanho/sobreposição do chunk: {describe_chunking(config)}")
     print(f"  5. Documentos por busca: {config['top_k']}")
     print(f"  6. Tokens máximos na resposta: {config['max_tokens']}")
     
+    base = load_settings(config["settings_path"])
+    if base:
+        # A base pode ter sido construída com outra estratégia (ex.: tokenizer sem offsets)
+        print(f"\n{Fore.CYAN}🗂️ Base atual: {base.get('chunk_strategy', 'chars')} ({describe_chunking(base)})")
+    
     print(f"\n{Fore.YELLOW}💡 Dicas:")
     print(f"• Chunks menores = busca mais precisa, mas pode perder contexto")
     print(f"• Mais documentos por busca = respostas mais completas")
@@ -1484,29 +2769,19 @@ def show_settings():
 # Sistema de Ajuda
 # ================================
 
+_HELP_MENU = render_menu("📚 CENTRAL DE AJUDA", 40, [
+    ("❓ Como começar", "Primeiros passos para usar o sistema"),
+    ("📁 Preparar documentos", "Como organizar seus arquivos .jsonl"),
+    ("🔧 Solução de problemas", "Erros comuns e soluções"),
+    ("💡 Dicas de uso", "Como obter melhores resultados"),
+    ("📖 Sobre o projeto", "Informações técnicas"),
+    ("🔙 Voltar", "Retorna ao menu principal"),
+])
+
 def show_help():
     """Sistema de ajuda interativo"""
     while True:
-        print(f"\n{Fore.CYAN}📚 CENTRAL DE AJUDA")
-        print(f"{Fore.CYAN}{'='*40}")
-        
-        print_menu_option(1, "❓ Como começar", 
-                         "Primeiros passos para usar o sistema")
-        
-        print_menu_option(2, "📁 Preparar documentos", 
-                         "Como organizar seus arquivos .jsonl")
-        
-        print_menu_option(3, "🔧 Solução de problemas", 
-                         "Erros comuns e soluções")
-        
-        print_menu_option(4, "💡 Dicas de uso", 
-                         "Como obter melhores resultados")
-        
-        print_menu_option(5, "📖 Sobre o projeto", 
-                         "Informações técnicas")
-        
-        print_menu_option(6, "🔙 Voltar", 
-                         "Retorna ao menu principal")
+        sys.stdout.write(_HELP_MENU)
         
         choice = get_user_choice(6)
         
@@ -1523,11 +2798,15 @@ def show_help():
         elif choice == 6:
             break
 
-def show_getting_started():
-    """Guia de primeiros passos"""
-    print(f"\n{Fore.GREEN}🚀 PRIMEIROS PASSOS")
-    print(f"{Fore.GREEN}{'='*30}")
-    print(f"""
+def _help_page(title: str, width: int, body: str) -> str:
+    """Monta uma tela de ajuda: título, sublinhado e corpo (cores resetadas a cada bloco)"""
+    return (f"\n{Fore.GREEN}{title}{Style.RESET_ALL}\n"
+            f"{Fore.GREEN}{'=' * width}{Style.RESET_ALL}\n"
+            f"{body}{Style.RESET_ALL}\n")
+
+# Telas de ajuda com conteúdo fixo: montadas uma vez na carga do módulo
+_HELP_PAGES = {
+    "getting_started": _help_page("🚀 PRIMEIROS PASSOS", 30, f"""
 {Fore.CYAN}Passo 1: Preparar documentos{Style.RESET_ALL}
 • Crie/verifique a pasta 'data' no diretório do programa
 • Adicione arquivos .jsonl com suas FAQs e documentos
@@ -1544,14 +2823,8 @@ def show_getting_started():
 • O sistema buscará as melhores respostas
 
 {Fore.YELLOW}🎯 Dica: Comece com poucos documentos para testar!{Style.RESET_ALL}
-    """)
-    wait_for_enter()
-
-def show_document_guide():
-    """Guia para preparação de documentos"""
-    print(f"\n{Fore.GREEN}📁 GUIA DE DOCUMENTOS")
-    print(f"{Fore.GREEN}{'='*30}")
-    print(f"""
+    """),
+    "document_guide": _help_page("📁 GUIA DE DOCUMENTOS", 30, f"""
 {Fore.CYAN}Estrutura recomendada:{Style.RESET_ALL}
 data/
 ├── faq_geral.jsonl
@@ -1560,8 +2833,8 @@ data/
 └── politicas.jsonl
 
 {Fore.CYAN}Formato dos arquivos .jsonl:{Style.RESET_ALL}
-{"id": "faq-001", "source": "faq_geral", "question": "Como funciona o sistema?", "answer": "Nosso sistema utiliza inteligência artificial..."}
-{"id": "faq-002", "source": "faq_geral", "question": "Quais são os preços?", "answer": "Oferecemos planos a partir de R$ 99/mês..."}
+{{"id": "faq-001", "source": "faq_geral", "question": "Como funciona o sistema?", "answer": "Nosso sistema utiliza inteligência artificial..."}}
+{{"id": "faq-002", "source": "faq_geral", "question": "Quais são os preços?", "answer": "Oferecemos planos a partir de R$ 99/mês..."}}
 
 {Fore.CYAN}Boas práticas:{Style.RESET_ALL}
 • Use linguagem clara e direta
@@ -1575,14 +2848,8 @@ P: Como entrar em contato?
 R: Entre em contato pelo WhatsApp (11) 99999-9999 ou 
 email contato@ictatechnology.com. Atendemos de segunda 
 a sexta das 9h às 18h.
-    """)
-    wait_for_enter()
-
-def show_troubleshooting():
-    """Guia de solução de problemas"""
-    print(f"\n{Fore.GREEN}🔧 SOLUÇÃO DE PROBLEMAS")
-    print(f"{Fore.GREEN}{'='*35}")
-    print(f"""
+    """),
+    "troubleshooting": _help_page("🔧 SOLUÇÃO DE PROBLEMAS", 35, f"""
 {Fore.RED}❌ "Nenhum arquivo .jsonl encontrado"{Style.RESET_ALL}
 • Verifique se a pasta 'data' existe
 • Confirme que há arquivos .jsonl na pasta
@@ -1608,14 +2875,8 @@ def show_troubleshooting():
 • GitHub: https://github.com/jesseff20/rag-chatbot
 • Issues: reporte problemas no GitHub
 • Email: contato@ictatechnology.com
-    """)
-    wait_for_enter()
-
-def show_usage_tips():
-    """Dicas de uso avançado"""
-    print(f"\n{Fore.GREEN}💡 DICAS DE USO AVANÇADO")
-    print(f"{Fore.GREEN}{'='*35}")
-    print(f"""
+    """),
+    "usage_tips": _help_page("💡 DICAS DE USO AVANÇADO", 35, f"""
 {Fore.CYAN}📝 Para melhores documentos:{Style.RESET_ALL}
 • Use perguntas que seus clientes realmente fazem
 • Inclua sinônimos e variações
@@ -1642,14 +2903,8 @@ def show_usage_tips():
 
 {Fore.YELLOW}🔄 Lembre-se: após mudanças nos documentos,{Style.RESET_ALL}
 {Fore.YELLOW}reconstrua a base de conhecimento (opção 1)!{Style.RESET_ALL}
-    """)
-    wait_for_enter()
-
-def show_about():
-    """Informações sobre o projeto"""
-    print(f"\n{Fore.GREEN}📖 SOBRE O PROJETO")
-    print(f"{Fore.GREEN}{'='*30}")
-    print(f"""
+    """),
+    "about": _help_page("📖 SOBRE O PROJETO", 30, f"""
 {Fore.CYAN}RAG Chatbot ICTA Technology{Style.RESET_ALL}
 Versão: 2.0 - Interface Simplificada
 Data: Agosto 2025
@@ -1682,7 +2937,32 @@ MIT License - Uso livre e modificação permitida
 
 {Fore.YELLOW}💝 Desenvolvido com ❤️ para a comunidade!{Style.RESET_ALL}
 {Fore.YELLOW}Contribuições e sugestões são bem-vindas.{Style.RESET_ALL}
-    """)
+    """),
+}
+
+def show_getting_started():
+    """Guia de primeiros passos"""
+    sys.stdout.write(_HELP_PAGES["getting_started"])
+    wait_for_enter()
+
+def show_document_guide():
+    """Guia para preparação de documentos"""
+    sys.stdout.write(_HELP_PAGES["document_guide"])
+    wait_for_enter()
+
+def show_troubleshooting():
+    """Guia de solução de problemas"""
+    sys.stdout.write(_HELP_PAGES["troubleshooting"])
+    wait_for_enter()
+
+def show_usage_tips():
+    """Dicas de uso avançado"""
+    sys.stdout.write(_HELP_PAGES["usage_tips"])
+    wait_for_enter()
+
+def show_about():
+    """Informações sobre o projeto"""
+    sys.stdout.write(_HELP_PAGES["about"])
     wait_for_enter()
 
 # ================================